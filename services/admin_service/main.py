@@ -18,7 +18,7 @@ from pydantic import BaseModel
 import httpx
 
 from database import get_db, init_database
-from models import AdminLog, GameSession, GameTurn, LogEntryRequest, LogEntryResponse, SessionSummary, DashboardStats
+from models import AdminLog, GameSession, GameTurn, LogEntryRequest, LogEntryResponse, SessionSummary, DashboardStats, BulkLogRequest
 from pdf_generator import PDFReportGenerator
 
 # Configure logging
@@ -292,6 +292,36 @@ async def create_log_entry(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@app.post("/log/bulk", response_model=dict)
+async def create_log_entries_bulk(
+    bulk: BulkLogRequest,
+    db: Session = Depends(get_db),
+    _: str = Depends(verify_admin_token)
+):
+    """Create many turn log entries in one transaction (batched shipping from Game Server)."""
+    try:
+        db.add_all([
+            AdminLog(
+                level="info",
+                service="game_server",
+                message=entry.text,
+                session_id=entry.session_id,
+                turn_id=str(entry.turn),
+                extra_data={"actions": entry.actions, "image": entry.image, "audio": entry.audio}
+            ) for entry in bulk.entries
+        ])
+        db.commit()
+
+        logger.info(f"Bulk log entries created: {len(bulk.entries)}")
+
+        return {"status": "logged", "count": len(bulk.entries)}
+
+    except Exception as e:
+        logger.error(f"Error creating bulk log entries: {e}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
 @app.get("/report/pdf")
 async def generate_pdf_report(
     session_id: Optional[str] = None,
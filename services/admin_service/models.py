@@ -69,6 +69,21 @@ class LogEntryRequest(BaseModel):
     extra_data: Optional[dict] = None
 
 
+class TurnLogEntry(BaseModel):
+    """Turn log entry sent by Game Server (contracts/schemas/admin_log.schema.json)."""
+    session_id: str
+    turn: int
+    actions: dict
+    text: str
+    image: Optional[str] = None
+    audio: Optional[str] = None
+
+
+class BulkLogRequest(BaseModel):
+    """Batch of turn log entries for bulk ingestion."""
+    entries: list[TurnLogEntry]
+
+
 class LogEntryResponse(BaseModel):
     """Response model for log entries."""
     id: int
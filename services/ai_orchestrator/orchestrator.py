@@ -9,6 +9,7 @@ from llm_client import generate_narrative_llm, generate_text_llm  # NEW
 from audio_client import get_music_url  # NEW
 from image_client import get_image_url   # NEW
 from shot_planner import plan_shot  # NEW
+from singleflight import SingleFlight, text_key
 import asyncio
 
 # SFX configuration
@@ -313,7 +314,7 @@ def _build_story_prompt(state: dict, user_text: str) -> str:
 async def _bg_generate_and_push(session_id: str, turn_id: int, prompt_text: str, provider_prompt: str | None = None):
     try:
         use_prompt = provider_prompt or prompt_text
-        url = await get_image_url(use_prompt)
+        url = await flights.do(("image", text_key(use_prompt)), lambda: get_image_url(use_prompt))
         if not url: return
         async with httpx.AsyncClient(timeout=30) as client:
             await client.post(f"{GS_INTERNAL_BASE}/image_update",
@@ -323,9 +324,16 @@ async def _bg_generate_and_push(session_id: str, turn_id: int, prompt_text: str,
     except Exception as e:
         print("[Orchestrator] bg_generate_and_push error:", e)
 
+# współbieżne identyczne generacje obrazu / Vision / TTS idą do backendu raz
+flights = SingleFlight()
+
+async def _post(url: str, body: dict, timeout: float) -> httpx.Response:
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        return await client.post(url, json=body)
+
 @app.get("/health")
 def health():
-    return {"status": "ok", "llm_enabled": LLM_ENABLED}
+    return {"status": "ok", "llm_enabled": LLM_ENABLED, "singleflight": flights.stats()}
 
 # DEMO manifest
 DEMO_MODE = os.getenv("DEMO_MODE","0") == "1"
@@ -454,7 +462,7 @@ async def orchestrate(req: OrchestrateReq):
     
     # Najpierw spróbuj real provider (Google/Banana/Local)
     try:
-        image_url = await get_image_url(narration)
+        image_url = await flights.do(("image", text_key(narration)), lambda: get_image_url(narration))
         if image_url:
             print(f"[Orchestrator] image provider OK: {image_url}")
     except Exception as e:
@@ -464,9 +472,8 @@ async def orchestrate(req: OrchestrateReq):
     if not image_url:
         image_rel = "/assets/images/placeholder.png"
         try:
-            async with httpx.AsyncClient(timeout=10) as client:
-                r = await client.post(VISION_URL, json={"text": narration})
-                image_rel = r.json().get("image_url", image_rel)
+            r = await flights.do(("vision", text_key(narration)), lambda: _post(VISION_URL, {"text": narration}, 10))
+            image_rel = r.json().get("image_url", image_rel)
             print(f"[Orchestrator] Vision fallback: {image_rel}")
         except Exception as e:
             print(f"[Orchestrator] vision fallback error: {e}")
@@ -475,12 +482,11 @@ async def orchestrate(req: OrchestrateReq):
     # 3) TTS przez TTS Gateway
     voice_audio = None
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            tts_req = {"text": narration, "turn_id": turn_id, "session_id": session_id}
-            r = await client.post(TTS_URL, json=tts_req)
-            if r.status_code == 200:
-                voice_audio = r.json().get("audio_url")
-                print(f"[DEBUG] TTS generated: {voice_audio}")
+        tts_req = {"text": narration, "turn_id": turn_id, "session_id": session_id}
+        r = await flights.do(("tts", text_key(narration)), lambda: _post(TTS_URL, tts_req, 15))
+        if r.status_code == 200:
+            voice_audio = r.json().get("audio_url")
+            print(f"[DEBUG] TTS generated: {voice_audio}")
     except Exception as e:
         print(f"[DEBUG] TTS failed: {e}")
 
@@ -1,5 +1,6 @@
 import os
 import json
+import zlib
 import asyncio
 import threading
 import tempfile
@@ -8,8 +9,19 @@ import requests
 import websockets
 
 WS_URL = os.getenv("WS_URL", "ws://localhost:65432/ws")
+# json | msgpack | deflate – kodowanie ramek serwera negocjowane przy loginie
+WS_ENCODING = os.getenv("WS_ENCODING", "json")
 OPEN_IMAGES = os.getenv("OPEN_IMAGES", "0") == "1"
 
+def decode_frame(raw):
+    # tekst = JSON; binarne: zlib (encoding "deflate", nagłówek 0x78) albo msgpack
+    if isinstance(raw, str):
+        return json.loads(raw)
+    if raw[:1] == b"\x78":
+        return json.loads(zlib.decompress(raw))
+    import msgpack
+    return msgpack.unpackb(raw, raw=False)
+
 def fetch_and_play_audio(url: str):
     try:
         import simpleaudio as sa
@@ -44,14 +56,14 @@ async def run_client():
     print(f"Łączenie z {ws_url} ...")
     async with websockets.connect(ws_url) as ws:
         # Login
-        await ws.send(json.dumps({"type": "login", "player": player, "session_id": session_id}))
+        await ws.send(json.dumps({"type": "login", "player": player, "session_id": session_id, "encoding": WS_ENCODING}))
         print("Zalogowano. Wpisuj akcje pełnym zdaniem (np. 'Przesłuchuję świadka').")
 
         async def recv_loop():
             while True:
                 raw = await ws.recv()
                 try:
-                    data = json.loads(raw)
+                    data = decode_frame(raw)
                 except Exception:
                     print("Odebrano:", raw)
                     continue
@@ -59,6 +71,9 @@ async def run_client():
                 if data.get("type") == "error":
                     print("Błąd:", data.get("reason"))
                     continue
+                if data.get("type") == "rate_limited":
+                    print(f"Za szybko – spróbuj ponownie za {data.get('retry_after')} s")
+                    continue
                 if data.get("type") == "info":
                     print("Info:", data.get("message"))
                     continue
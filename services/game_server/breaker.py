@@ -0,0 +1,71 @@
+"""
+Circuit breaker dla usług downstream Game Servera.
+
+closed – wywołania idą normalnie; BREAKER_FAILURES kolejnych błędów (wyjątek
+transportu/timeout albo odpowiedź 5xx) otwiera obwód. open – wywołanie od razu
+rzuca CircuitOpenError, więc tura przechodzi na fallback zamiast czekać cały
+timeout httpx. Po BREAKER_RESET_SECONDS obwód jest half-open: przepuszcza jedno
+wywołanie próbne – sukces zamyka obwód, błąd otwiera go ponownie.
+"""
+import os, time, logging
+
+log = logging.getLogger("game_server.breaker")
+
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "15"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.max_failures = failures
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened = 0
+        self.rejected = 0
+        self._probing = False
+
+    def before(self):
+        """Przed wywołaniem: rzuca CircuitOpenError, jeśli obwód nie przepuszcza ruchu."""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.name} circuit open")
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            if self._probing:
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.name} circuit half-open, probe in flight")
+            self._probing = True
+
+    def success(self):
+        if self.state != CLOSED:
+            log.info("Circuit %s closed", self.name)
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def failure(self):
+        self._probing = False
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.max_failures:
+            if self.state != OPEN:
+                self.opened += 1
+                log.warning("Circuit %s open after %d failures", self.name, self.failures)
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        # wywołanie przerwane (anulowane) – ani sukces, ani błąd; zwalniamy miejsce próby
+        self._probing = False
+
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self.failures, "opened": self.opened, "rejected": self.rejected}
@@ -0,0 +1,84 @@
+"""
+Graf sprawy (tablica śledczego) z indeksami.
+
+Węzły w słowniku id -> węzeł, krawędzie indeksowane kluczem (from, to, label)
+plus mapy sąsiedztwa – wyszukiwanie O(1). Ta sama krawędź dodana ponownie
+nie jest duplikowana: zostaje jedna, z wyższą z pewności (confidence).
+to_dict() zwraca dotychczasowy kształt {"nodes": [...], "edges": [...]}.
+"""
+
+
+class CaseGraph:
+    __slots__ = ("nodes", "edges", "_nodes", "_edges", "_out", "_in")
+
+    def __init__(self):
+        self.nodes: list[dict] = []                    # kolejność dodania (eksport)
+        self.edges: list[dict] = []
+        self._nodes: dict[str, dict] = {}              # id -> węzeł
+        self._edges: dict[tuple, int] = {}             # (from, to, label) -> indeks w edges
+        self._out: dict[str, dict[tuple, dict]] = {}   # from -> (to, label) -> krawędź
+        self._in: dict[str, dict[tuple, dict]] = {}    # to -> (from, label) -> krawędź
+
+    @classmethod
+    def from_dict(cls, data: dict | None) -> "CaseGraph":
+        g = cls()
+        for n in (data or {}).get("nodes", []) or []:
+            g.add_node(n)
+        for e in (data or {}).get("edges", []) or []:
+            g.add_edge(e)
+        return g
+
+    def to_dict(self) -> dict:
+        return {"nodes": self.nodes, "edges": self.edges}
+
+    def node(self, node_id: str) -> dict | None:
+        return self._nodes.get(node_id)
+
+    def edge(self, src: str, dst: str, label: str) -> dict | None:
+        i = self._edges.get((src, dst, label))
+        return self.edges[i] if i is not None else None
+
+    def out_edges(self, node_id: str) -> list[dict]:
+        return list(self._out.get(node_id, {}).values())
+
+    def in_edges(self, node_id: str) -> list[dict]:
+        return list(self._in.get(node_id, {}).values())
+
+    def add_node(self, n: dict) -> bool:
+        """True, jeśli węzeł jest nowy (istniejący id zostaje bez zmian)."""
+        node_id = n.get("id")
+        if node_id is None or node_id in self._nodes:
+            return False
+        n = dict(n)
+        self._nodes[node_id] = n
+        self.nodes.append(n)
+        return True
+
+    def add_edge(self, e: dict) -> tuple[str, int] | None:
+        """("append", i) dla nowej krawędzi, ("update", i) gdy wzrosła pewność, None gdy nic się nie zmieniło."""
+        src, dst, label = e.get("from"), e.get("to"), e.get("label", "")
+        if src is None or dst is None:
+            return None
+        conf = _confidence(e.get("confidence"))
+        i = self._edges.get((src, dst, label))
+        if i is not None:
+            cur = self.edges[i]
+            if conf is None or (cur.get("confidence") is not None and conf <= cur["confidence"]):
+                return None
+            cur["confidence"] = conf
+            return ("update", i)
+        e = dict(e)
+        if conf is not None:
+            e["confidence"] = conf
+        self._edges[(src, dst, label)] = len(self.edges)
+        self.edges.append(e)
+        self._out.setdefault(src, {})[(dst, label)] = e
+        self._in.setdefault(dst, {})[(src, label)] = e
+        return ("append", len(self.edges) - 1)
+
+
+def _confidence(v) -> float | None:
+    try:
+        return float(v) if v is not None else None
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,173 @@
+"""
+Połączenia WebSocket graczy z kolejką wyjściową (outbox).
+
+Każde gniazdo ma ograniczoną kolejkę ramek i własne zadanie-writer, więc
+wolny klient nie hamuje broadcastu ani pozostałych graczy. Ramki wymienialne
+(COALESCE_KEYS) z tym samym kluczem podmieniają wersję, która jeszcze czeka
+w kolejce – override_update scalamy pole po polu, bo niesie tylko zmienione
+media. Przepełnienie kolejki (WS_OUTBOX_MAX) albo przekroczony WS_SEND_TIMEOUT
+zamyka połączenie; gracz wypada z sesji przy następnym broadcaście.
+Połączenie z drop_oldest=True (widzowie) przy przepełnieniu gubi najstarszą
+ramkę z kolejki zamiast się zamykać.
+Writer koduje ramkę (wire.Frame) kodowaniem wynegocjowanym przy loginie.
+Ramka numerowana (seq), która podmienia czekającą w kolejce, dostaje listę
+"replaces" z numerami podmienionych – klient liczy je jako odebrane.
+hold()/release() wstrzymują ramki na czas odtwarzania zaległych po reconnect.
+Tryb stanu (delta, acked – wersja potwierdzona przez klienta) i mediów
+(progressive) należy do połączenia, nie do sesji – ramkę dla niego składa
+views.FrameViews (skipped – seq ramek innego trybu, pominiętych u klienta).
+"""
+import os, asyncio, logging
+from collections import deque
+from fastapi.websockets import WebSocket, WebSocketState
+from wire import Frame
+
+# Deadline (s) wysyłki jednej ramki do jednego gniazda; po przekroczeniu gniazdo jest zamykane
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+WS_OUTBOX_MAX = int(os.getenv("WS_OUTBOX_MAX", "64"))
+
+log = logging.getLogger("game_server.connections")
+
+# typ ramki -> pola, które razem z typem tworzą klucz podmiany
+COALESCE_KEYS = {
+    "image_update": ("turn_id",),
+    "override_update": ("turn_id",),
+    "media_ready": ("turn_id", "kind"),   # głos i obraz tej samej tury to różne ramki
+}
+
+_open: set["ClientConn"] = set()
+_closing: set[asyncio.Task] = set()
+
+
+def coalesce_key(payload: dict) -> tuple | None:
+    fields = COALESCE_KEYS.get(payload.get("type"))
+    if fields is None:
+        return None
+    return (payload["type"], *(payload.get(f) for f in fields))
+
+
+def stats() -> dict:
+    return {"open": len(_open), "queued": sum(len(c._queue) for c in _open),
+            "coalesced": sum(c.coalesced for c in _open)}
+
+
+class ClientConn:
+    def __init__(self, ws: WebSocket, player: str, encoding: str = "json",
+                 max_queue: int = WS_OUTBOX_MAX, drop_oldest: bool = False, delta: bool = False,
+                 progressive: bool = False):
+        self.ws = ws
+        self.player = player
+        self.encoding = encoding
+        self.delta = delta
+        self.acked = 0
+        self.progressive = progressive
+        self.skipped: list[int] = []
+        self.max_queue = max_queue
+        self.drop_oldest = drop_oldest
+        self.closed = False
+        self.coalesced = 0
+        self.dropped = 0
+        self._queue: deque[list] = deque()        # [klucz, Frame]
+        self._pending: dict[tuple, list] = {}     # klucz -> wpis jeszcze w kolejce
+        self._held: list[tuple] | None = None   # ramki wstrzymane do release()
+        self._wakeup = asyncio.Event()
+        self._writer = asyncio.create_task(self._run())
+        _open.add(self)
+
+    @property
+    def alive(self) -> bool:
+        return (not self.closed and self.ws.client_state == WebSocketState.CONNECTED
+                and self.ws.application_state == WebSocketState.CONNECTED)
+
+    def send(self, frame: Frame, key: tuple | None = None) -> bool:
+        """Wrzuca ramkę do kolejki (bez czekania). False = połączenie zamknięte lub przepełnione."""
+        if self.closed:
+            return False
+        if self._held is not None:
+            self._held.append((frame, key))
+            return True
+        entry = self._pending.get(key) if key is not None else None
+        if entry is not None:
+            old = entry[1].payload
+            if key[0] == "override_update":
+                payload = {**old, **{k: v for k, v in frame.payload.items() if v is not None}}
+            else:
+                payload = frame.payload
+            if old.get("seq") is not None and frame.payload.get("seq") is not None:
+                payload = {**payload, "seq": frame.payload["seq"],
+                           "replaces": [*old.get("replaces", []), old["seq"], *frame.payload.get("replaces", [])]}
+            entry[1] = frame if payload is frame.payload else Frame(payload)
+            self.coalesced += 1
+            return True
+        if len(self._queue) >= self.max_queue:
+            if self.drop_oldest:
+                old = self._queue.popleft()
+                if old[0] is not None and self._pending.get(old[0]) is old:
+                    del self._pending[old[0]]
+                self.dropped += 1
+            else:
+                log.warning("Outbox overflow (%d frames) – disconnecting slow client", self.max_queue,
+                            extra={"player": self.player})
+                self.close()
+                return False
+        entry = [key, frame]
+        self._queue.append(entry)
+        if key is not None:
+            self._pending[key] = entry
+        self._wakeup.set()
+        return True
+
+    def send_json(self, payload: dict) -> bool:
+        return self.send(Frame(payload), coalesce_key(payload))
+
+    def hold(self):
+        """Od teraz ramki czekają poza kolejką aż do release()."""
+        if self._held is None:
+            self._held = []
+
+    def release(self, first: list[Frame], skip: set[int]):
+        """Najpierw ramki first (info, zaległe), potem wstrzymane – bez tych o seq ze skip (już w first)."""
+        held, self._held = self._held or [], None
+        for frame in first:
+            self.send(frame)
+        for frame, key in held:
+            if frame.payload.get("seq") not in skip:
+                self.send(frame, key)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        self._pending.clear()
+        _open.discard(self)
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        task = asyncio.create_task(self._close_ws())
+        _closing.add(task)
+        task.add_done_callback(_closing.discard)
+
+    async def _run(self):
+        try:
+            while True:
+                while not self._queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                entry = self._queue.popleft()
+                if entry[0] is not None and self._pending.get(entry[0]) is entry:
+                    del self._pending[entry[0]]
+                data = entry[1].encoded(self.encoding)
+                send = self.ws.send_bytes(data) if isinstance(data, bytes) else self.ws.send_text(data)
+                await asyncio.wait_for(send, WS_SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # timeout albo zerwane gniazdo – strumień ramek jest już niespójny
+            log.info("Send failed, closing connection: %s", e, extra={"player": self.player})
+            self.close()
+
+    async def _close_ws(self):
+        try:
+            await asyncio.wait_for(self.ws.close(), WS_SEND_TIMEOUT)
+        except Exception:
+            pass
@@ -0,0 +1,121 @@
+"""
+Współdzielone klienty HTTP do usług downstream Game Servera.
+
+Jeden httpx.AsyncClient (pula połączeń keep-alive) na usługę, tworzony przy
+starcie aplikacji i zamykany przy shutdown – bez handshake'u TCP na każde
+wywołanie w turze. post(..., dedupe=klucz) łączy współbieżne identyczne
+wywołania idempotentne (single-flight) w jedno żądanie. Każda usługa ma
+własny circuit breaker (breaker.py) – martwa zależność odpowiada od razu
+CircuitOpenError zamiast pełnego timeoutu.
+"""
+import os, json, asyncio, logging
+import httpx
+from singleflight import SingleFlight
+from breaker import CircuitBreaker
+
+log = logging.getLogger("game_server.downstream")
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "0") == "1"
+
+# Domyślne timeouty (s) per usługa; pojedyncze wywołania mogą je nadpisać (timeout=...)
+SERVICE_TIMEOUTS = {
+    "supervisor": float(os.getenv("SUPERVISOR_TIMEOUT", "15")),
+    "ai":         float(os.getenv("AI_TIMEOUT", "30")),
+    "tts":        float(os.getenv("TTS_TIMEOUT", "15")),
+    "vision":     float(os.getenv("VISION_TIMEOUT", "10")),
+    "admin":      float(os.getenv("ADMIN_TIMEOUT", "15")),
+}
+
+# HTTP/2 wymaga pakietu h2 (httpx[http2]) – bez niego zostajemy przy HTTP/1.1
+_http2 = False
+if HTTP2_ENABLED:
+    try:
+        import h2  # noqa: F401
+        _http2 = True
+    except Exception:
+        log.warning("HTTP2_ENABLED=1, but h2 is not installed – using HTTP/1.1")
+
+_clients: dict[str, httpx.AsyncClient] = {}
+_breakers: dict[str, CircuitBreaker] = {name: CircuitBreaker(name) for name in SERVICE_TIMEOUTS}
+flights = SingleFlight()
+
+def _make_client(name: str) -> httpx.AsyncClient:
+    total = SERVICE_TIMEOUTS.get(name, 15.0)
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(total, connect=min(total, HTTP_CONNECT_TIMEOUT)),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        http2=_http2,
+    )
+
+def start():
+    for name in SERVICE_TIMEOUTS:
+        if name not in _clients:
+            _clients[name] = _make_client(name)
+
+async def close():
+    clients = list(_clients.values())
+    _clients.clear()
+    for c in clients:
+        try:
+            await c.aclose()
+        except Exception:
+            pass
+
+def client(name: str) -> httpx.AsyncClient:
+    # leniwie – gdyby ktoś zawołał przed startupem
+    c = _clients.get(name)
+    if c is None or c.is_closed:
+        c = _clients[name] = _make_client(name)
+    return c
+
+def breaker(name: str) -> CircuitBreaker:
+    b = _breakers.get(name)
+    if b is None:
+        b = _breakers[name] = CircuitBreaker(name)
+    return b
+
+def breaker_stats() -> dict:
+    return {name: b.stats() for name, b in _breakers.items()}
+
+async def _guarded(name: str, call) -> httpx.Response:
+    """call() -> korutyna żądania; wynik (wyjątek / 5xx / sukces) aktualizuje breaker usługi."""
+    b = breaker(name)
+    b.before()
+    try:
+        r = await call()
+    except asyncio.CancelledError:
+        b.release()
+        raise
+    except Exception:
+        b.failure()
+        raise
+    if r.status_code >= 500:
+        b.failure()
+    else:
+        b.success()   # 4xx to odpowiedź żywej usługi
+    return r
+
+async def post(name: str, url: str, dedupe: str | None = None, guard: str | None = None,
+               **kwargs) -> httpx.Response:
+    """guard – nazwa breakera, gdy wywołanie (np. praca w tle) nie ma wpływać na breaker usługi."""
+    guard = guard or name
+    if dedupe is None:
+        return await _guarded(guard, lambda: client(name).post(url, **kwargs))
+    # odpowiedź jest już w pełni wczytana – można ją oddać wielu czekającym
+    return await flights.do((name, url, dedupe), lambda: _guarded(guard, lambda: client(name).post(url, **kwargs)))
+
+async def post_state(name: str, url: str, state_key: str, state_json: bytes, body: dict | None = None,
+                     **kwargs) -> httpx.Response:
+    """POST {state_key: <stan>, **body}; stan to gotowy JSON (GameState.to_json_bytes) – bez ponownej serializacji."""
+    tail = b"," + json.dumps(body, ensure_ascii=False)[1:].encode("utf-8") if body else b"}"
+    content = b'{' + json.dumps(state_key).encode("utf-8") + b':' + state_json + tail
+    headers = {"Content-Type": "application/json", **kwargs.pop("headers", {})}
+    return await _guarded(name, lambda: client(name).post(url, content=content, headers=headers, **kwargs))
@@ -1,21 +1,75 @@
+import os, json
+from collections import deque
+from case_graph import CaseGraph
+
+# Ile operacji zmian stanu trzymamy dla klientów delta (starszy ack => pełny snapshot)
+STATE_CHANGELOG_MAX = int(os.getenv("STATE_CHANGELOG_MAX", "500"))
+# Ile ostatnich narracji trzymamy w historii (Orchestrator korzysta z 2–3 ostatnich)
+STORY_HISTORY_MAX = int(os.getenv("STORY_HISTORY_MAX", "10"))
+# Ile ostatnich ramek broadcastu trzymamy do odtworzenia po reconnect (login z last_seq)
+WS_REPLAY_MAX = int(os.getenv("WS_REPLAY_MAX", "32"))
+
+# Pola wchodzące do to_json() – przypisanie któregoś z nich unieważnia cache
+_SERIALIZED = frozenset({"session_id", "turn_id", "story_history", "players", "actions", "metrics", "casefile",
+                         "inventory", "location", "relations", "case_graph"})
+
 class GameState:
+    __slots__ = ("session_id", "turn_id", "story_history", "players", "actions",
+                 "single_player", "bot_name", "bot_persona", "scenario",
+                 "metrics", "casefile", "inventory", "location", "relations", "graph",
+                 "state_version", "acked_versions", "_changes", "_changes_floor", "_ops",
+                 "frame_seq", "_replay", "_replay_floor",
+                 "_json", "_json_bytes")
+
     def __init__(self, session_id: str):
+        self._json = None             # cache to_json() / to_json_bytes(), None = nieaktualny
+        self._json_bytes = None
         self.session_id = session_id
         self.turn_id = 1
-        self.story_history = []       # [{turn,text}]
+        self.story_history = deque(maxlen=STORY_HISTORY_MAX)   # [{turn,text}], najstarsze wypadają
         self.players = {}             # name -> ws (bot ma ws=None)
         self.actions = {}             # name -> action str
         # Single player
         self.single_player = False
         self.bot_name = None
         self.bot_persona = None
+        self.scenario = None          # nazwa scenariusza skryptowanego (None/nieznana => AI)
         # Story mode
         self.metrics = {"time": 20, "suspicion": 0, "reputation": 0}
         self.casefile = {"clues": [], "suspects": []}
         self.inventory = {"pistol_loaded": False, "ammo": 0, "cigarettes": 0, "matches": 0}
         self.location = "office"
         self.relations = {}  # name -> {mood:int, trust:int, fear:int} (0..100)
-        self.case_graph = {"nodes": [], "edges": []}
+        self.graph = CaseGraph()
+        # Protokół delta: wersja stanu świata + dziennik operacji {v, op, path, value}
+        self.state_version = 0
+        self.acked_versions = {}      # name -> ostatnia potwierdzona wersja
+        self._changes = deque()
+        self._changes_floor = 0       # operacje z wersji <= floor mogły wypaść z dziennika
+        self._ops = []
+        # Numeracja ramek broadcastu sesji + bufor ostatnich ramek do odtworzenia
+        self.frame_seq = 0
+        self._replay = deque(maxlen=WS_REPLAY_MAX)   # (seq, tekst JSON ramki), rosnąco
+        self._replay_floor = 0        # ramki z seq <= floor mogły wypaść z bufora
+
+    @property
+    def case_graph(self) -> dict:
+        """Graf w kształcie kontraktu {"nodes","edges"} (listy współdzielone z self.graph)."""
+        return self.graph.to_dict()
+
+    @case_graph.setter
+    def case_graph(self, value: dict):
+        self.graph = CaseGraph.from_dict(value)
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in _SERIALIZED:
+            self._invalidate()
+
+    def _invalidate(self):
+        # zmiany w miejscu (dict/list) zgłaszają metody mutujące; przypisania – __setattr__
+        object.__setattr__(self, "_json", None)
+        object.__setattr__(self, "_json_bytes", None)
 
     def _clamp(self, v, lo=0, hi=100): 
         return max(lo, min(hi, int(v)))
@@ -27,40 +81,181 @@ class GameState:
             self.relations[name] = r
         return r
 
+    def _set(self, path: list, value):
+        self._ops.append({"op": "set", "path": path, "value": value})
+
+    def _append(self, path: list, value):
+        self._ops.append({"op": "append", "path": path, "value": value})
+
+    def _commit(self):
+        # wszystkie operacje jednej mutacji dostają wspólną, nową wersję
+        if not self._ops:
+            return
+        self.state_version += 1
+        for op in self._ops:
+            op["v"] = self.state_version
+            self._changes.append(op)
+        self._ops = []
+        while len(self._changes) > STATE_CHANGELOG_MAX:
+            self._changes_floor = self._changes.popleft()["v"]
+
+    def world_snapshot(self) -> dict:
+        return {
+            "metrics": self.metrics,
+            "inventory": self.inventory,
+            "location": self.location,
+            "relations": self.relations,
+            "casefile": self.casefile,
+            "case_graph": self.case_graph,
+        }
+
+    def delta_since(self, version: int) -> dict | None:
+        """Operacje nowsze niż version; None gdy dziennik już ich nie obejmuje (trzeba snapshot)."""
+        if version < self._changes_floor:
+            return None
+        return {"base": version, "ops": [op for op in self._changes if op["v"] > version]}
+
+    def next_frame_seq(self) -> int:
+        self.frame_seq += 1
+        return self.frame_seq
+
+    def remember_frame(self, seq: int, text: str):
+        # tekst, nie payload – payload wskazuje na żywy stan, replay ma pokazać ramkę z chwili wysyłki
+        if len(self._replay) == self._replay.maxlen:
+            self._replay_floor = self._replay[0][0]
+        self._replay.append((seq, text))
+
+    def frames_since(self, seq: int) -> list[tuple[int, str]] | None:
+        """Ramki (seq, tekst) nowsze niż seq; None gdy bufor już ich nie obejmuje (albo seq z innego życia sesji)."""
+        if seq < self._replay_floor or seq > self.frame_seq:
+            return None
+        return [f for f in self._replay if f[0] > seq]
+
     def _cg_merge(self, delta: dict):
-        nodes = delta.get("nodes_add", []) or []
-        edges = delta.get("edges_add", []) or []
-        # proste łączenie, bez usuwania duplikatów (MVP dopuszcza duplikaty wg id – lepiej filtr)
-        seen = {n["id"] for n in self.case_graph["nodes"]}
-        for n in nodes:
-            if n["id"] not in seen:
-                self.case_graph["nodes"].append(n)
-                seen.add(n["id"])
-        self.case_graph["edges"].extend(edges)
-
-    def add_player(self, name, ws): self.players[name] = ws
-    def replace_player_ws(self, name, ws): self.players[name] = ws
-    def record_action(self, player, action):
-        self.actions[player] = action
-        return len(self.players) >= 2 and len(self.actions) == len(self.players)
+        # węzły po id, krawędzie po (from, to, label) – powtórki nie rosną, pewność bierze maksimum;
+        # do dziennika idą kopie, bo krawędź w grafie może się jeszcze zmienić
+        for n in delta.get("nodes_add", []) or []:
+            if self.graph.add_node(n):
+                self._append(["case_graph", "nodes"], dict(n))
+        for e in delta.get("edges_add", []) or []:
+            res = self.graph.add_edge(e)
+            if res is None:
+                continue
+            kind, i = res
+            if kind == "append":
+                self._append(["case_graph", "edges"], dict(self.graph.edges[i]))
+            else:
+                self._set(["case_graph", "edges", i], dict(self.graph.edges[i]))
+        self._commit()
+        self._invalidate()
 
-    def to_json(self):
+    def to_snapshot(self) -> dict:
+        """Stan sesji do zapisu poza procesem – bez gniazd (tylko nazwy graczy)."""
         return {
             "session_id": self.session_id,
             "turn_id": self.turn_id,
-            "history": self.story_history,
+            "story_history": list(self.story_history),
             "players": list(self.players.keys()),
             "actions": self.actions,
+            "single_player": self.single_player,
+            "bot_name": self.bot_name,
+            "bot_persona": self.bot_persona,
+            "scenario": self.scenario,
             "metrics": self.metrics,
             "casefile": self.casefile,
-            "inventory": getattr(self, "inventory", {"pistol_loaded": False, "ammo": 0, "cigarettes": 0, "matches": 0}),
-            "location": getattr(self, "location", "office"),
+            "inventory": self.inventory,
+            "location": self.location,
             "relations": self.relations,
-            "case_graph": self.case_graph
+            "case_graph": self.case_graph,
+            "state_version": self.state_version,
+            "acked_versions": self.acked_versions,
+            "changes": list(self._changes),
+            "changes_floor": self._changes_floor,
+            "frame_seq": self.frame_seq,
         }
 
+    @classmethod
+    def from_snapshot(cls, data: dict) -> "GameState":
+        state = cls(data["session_id"])
+        state.load_snapshot(data)
+        return state
+
+    def load_snapshot(self, data: dict):
+        """Nadpisuje stan danymi ze snapshotu, zachowując lokalne gniazda graczy."""
+        local = self.players
+        # gracze z innych replik (i bot) mają tu ws=None
+        self.players = {name: local.get(name) for name in data.get("players", [])}
+        for name, ws in local.items():
+            if ws is not None and name not in self.players:
+                self.players[name] = ws
+        self.turn_id = data.get("turn_id", 1)
+        self.story_history = deque(data.get("story_history", []), maxlen=STORY_HISTORY_MAX)
+        self.actions = data.get("actions", {})
+        self.single_player = data.get("single_player", False)
+        self.bot_name = data.get("bot_name")
+        self.bot_persona = data.get("bot_persona")
+        self.scenario = data.get("scenario")
+        self.metrics = data.get("metrics", self.metrics)
+        self.casefile = data.get("casefile", self.casefile)
+        self.inventory = data.get("inventory", self.inventory)
+        self.location = data.get("location", self.location)
+        self.relations = data.get("relations", self.relations)
+        if "case_graph" in data:
+            self.case_graph = data["case_graph"]
+        self.state_version = data.get("state_version", 0)
+        # wersje potwierdzone rosną monotonicznie – nowszy ack lokalny wygrywa
+        acked = dict(data.get("acked_versions", {}))
+        for name, v in self.acked_versions.items():
+            acked[name] = max(v, acked.get(name, 0))
+        self.acked_versions = acked
+        self._changes = deque(data.get("changes", []))
+        self._changes_floor = data.get("changes_floor", 0)
+        # numeracja ramek tylko rośnie; bufor ramek nie jest częścią snapshotu –
+        # sesja odtworzona bez niego nie odtwarza ramek sprzed zrzutu
+        self.frame_seq = max(self.frame_seq, data.get("frame_seq", 0))
+        if not self._replay:
+            self._replay_floor = self.frame_seq
+
+    def add_player(self, name, ws):
+        if name not in self.players:
+            self._invalidate()
+        self.players[name] = ws
+    def replace_player_ws(self, name, ws): self.add_player(name, ws)
+    def remove_player(self, name):
+        self.players.pop(name, None)
+        self._invalidate()
+    def record_action(self, player, action):
+        self.actions[player] = action
+        self._invalidate()
+        return len(self.players) >= 2 and len(self.actions) == len(self.players)
+
+    def to_json(self) -> dict:
+        """Stan dla Orchestratora; budowany raz po każdej mutacji (nie modyfikować wyniku)."""
+        if self._json is None:
+            object.__setattr__(self, "_json", {
+                "session_id": self.session_id,
+                "turn_id": self.turn_id,
+                "history": list(self.story_history),
+                "players": list(self.players.keys()),
+                "actions": dict(self.actions),
+                "metrics": self.metrics,
+                "casefile": self.casefile,
+                "inventory": self.inventory,
+                "location": self.location,
+                "relations": self.relations,
+                "case_graph": self.case_graph
+            })
+        return self._json
+
+    def to_json_bytes(self) -> bytes:
+        """to_json() zserializowane do JSON (UTF-8); cache jak wyżej."""
+        if self._json_bytes is None:
+            object.__setattr__(self, "_json_bytes", json.dumps(self.to_json(), ensure_ascii=False).encode("utf-8"))
+        return self._json_bytes
+
     def apply_narration(self, text):
         self.story_history.append({"turn": self.turn_id, "text": text})
+        self._invalidate()
 
     def apply_storystep(self, story: dict):
         # metrics
@@ -68,24 +263,31 @@ class GameState:
         for k, v in delta.items():
             if k in self.metrics and isinstance(v, int):
                 self.metrics[k] += v
+                self._set(["metrics", k], self.metrics[k])
         # location
         new_loc = story.get("state_diff", {}).get("location")
         if isinstance(new_loc, str) and new_loc:
             self.location = new_loc
+            self._set(["location"], new_loc)
         # inventory
         inv = story.get("state_diff", {}).get("inventory", {})
         if inv:
             if "pistol_loaded" in inv:
                 self.inventory["pistol_loaded"] = bool(inv["pistol_loaded"])
+                self._set(["inventory", "pistol_loaded"], self.inventory["pistol_loaded"])
             if "ammo_delta" in inv:
                 self.inventory["ammo"] = max(0, int(self.inventory.get("ammo",0)) + int(inv["ammo_delta"]))
+                self._set(["inventory", "ammo"], self.inventory["ammo"])
             if "cigarettes_delta" in inv:
                 self.inventory["cigarettes"] = max(0, int(self.inventory.get("cigarettes",0)) + int(inv["cigarettes_delta"]))
+                self._set(["inventory", "cigarettes"], self.inventory["cigarettes"])
         # casefile
         for c in story.get("state_diff", {}).get("casefile", {}).get("clues_add", []):
             self.casefile["clues"].append(c)
+            self._append(["casefile", "clues"], c)
         for s in story.get("state_diff", {}).get("casefile", {}).get("suspects_upd", []):
             self.casefile["suspects"].append(s)
+            self._append(["casefile", "suspects"], s)
         # relations
         for rd in story.get("relations_delta", []):
             name = rd.get("name")
@@ -94,10 +296,13 @@ class GameState:
             r["mood"]  = self._clamp(r["mood"]  + int(rd.get("mood_delta",0)))
             r["trust"] = self._clamp(r["trust"] + int(rd.get("trust_delta",0)))
             r["fear"]  = self._clamp(r["fear"]  + int(rd.get("fear_delta",0)))
+            self._set(["relations", name], dict(r))
         
         # case graph
         if story.get("graph_delta"):
             self._cg_merge(story["graph_delta"])
+        self._commit()
+        self._invalidate()
 
     def next_turn(self):
         self.turn_id += 1
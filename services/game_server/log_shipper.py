@@ -0,0 +1,140 @@
+"""
+Asynchroniczna wysyłka logów tur do Admin Service (POST /log/bulk).
+
+enqueue() nigdy nie czeka na sieć: wpis trafia do ograniczonej kolejki w pamięci,
+a zadanie w tle wysyła paczki po LOG_BATCH_SIZE wpisów albo co LOG_FLUSH_INTERVAL s.
+Gdy Admin nie odpowiada – kilka prób z backoffem, potem paczka ląduje na dysku
+(JSONL) i jest dosyłana przy następnym udanym flushu.
+"""
+import os, json, asyncio, logging
+import downstream
+from telemetry import span
+
+log = logging.getLogger("game_server.admin_log")
+
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "5000"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "100"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "2"))
+LOG_RETRIES = int(os.getenv("LOG_RETRIES", "3"))
+LOG_SPILL_PATH = os.getenv("LOG_SPILL_PATH", "data/admin_log_spill.jsonl")
+
+
+class LogShipper:
+    def __init__(self, url: str, headers: dict | None = None):
+        self.url = url
+        self.headers = headers or {}
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=LOG_QUEUE_MAX)
+        self.dropped = 0
+        self._task: asyncio.Task | None = None
+
+    def enqueue(self, entry: dict):
+        try:
+            self.queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            # kolejka pełna (Admin i dysk nie nadążają) – tracimy wpis zamiast blokować turę
+            self.dropped += 1
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        # resztę z kolejki: jedna próba wysyłki, w razie porażki – na dysk
+        batch = []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        if batch:
+            try:
+                await asyncio.wait_for(self._ship(batch, retries=1), timeout)
+            except Exception:
+                await asyncio.to_thread(self._spill, batch)
+
+    def stats(self) -> dict:
+        return {"queued": self.queue.qsize(), "dropped": self.dropped}
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._ship(batch)
+            except Exception as e:
+                log.error("Log shipper error: %s", e)
+
+    async def _next_batch(self) -> list[dict]:
+        # czekaj na pierwszy wpis, potem zbieraj do rozmiaru paczki albo upływu interwału
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + LOG_FLUSH_INTERVAL
+        while len(batch) < LOG_BATCH_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _post(self, batch: list[dict], retries: int) -> bool:
+        for attempt in range(retries):
+            try:
+                with span("admin_log"):
+                    r = await downstream.post("admin", self.url, headers=self.headers, json={"entries": batch})
+                if r.status_code < 300:
+                    return True
+                if 400 <= r.status_code < 500 and r.status_code not in (408, 429):
+                    # błędny payload – ponawianie nic nie da
+                    log.error("Admin rejected log batch (%s), dropping %d entries", r.status_code, len(batch))
+                    return True
+            except Exception as e:
+                log.warning("Admin log batch failed (attempt %d/%d): %s", attempt + 1, retries, e)
+            if attempt + 1 < retries:
+                await asyncio.sleep(0.5 * (2 ** attempt))
+        return False
+
+    async def _ship(self, batch: list[dict], retries: int = LOG_RETRIES):
+        if await self._post(batch, retries):
+            await self._replay_spill()
+        else:
+            await asyncio.to_thread(self._spill, batch)
+
+    def _spill(self, batch: list[dict]):
+        os.makedirs(os.path.dirname(LOG_SPILL_PATH) or ".", exist_ok=True)
+        with open(LOG_SPILL_PATH, "a", encoding="utf-8") as f:
+            for entry in batch:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        log.warning("Admin unavailable – spilled %d log entries to %s", len(batch), LOG_SPILL_PATH)
+
+    def _take_spill(self) -> list[dict]:
+        # .replay mógł zostać po przerwanym dosyłaniu – wtedy najpierw on
+        replay = LOG_SPILL_PATH + ".replay"
+        if not os.path.exists(replay):
+            if not os.path.exists(LOG_SPILL_PATH):
+                return []
+            os.replace(LOG_SPILL_PATH, replay)
+        entries = []
+        with open(replay, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except Exception:
+                    pass
+        os.remove(replay)
+        return entries
+
+    async def _replay_spill(self):
+        entries = await asyncio.to_thread(self._take_spill)
+        for i in range(0, len(entries), LOG_BATCH_SIZE):
+            chunk = entries[i:i + LOG_BATCH_SIZE]
+            if not await self._post(chunk, retries=1):
+                await asyncio.to_thread(self._spill, entries[i:])
+                return
+        if entries:
+            log.info("Replayed %d spilled log entries to Admin", len(entries))
@@ -0,0 +1,110 @@
+"""
+Strukturalne logowanie Game Servera (stdlib logging).
+
+Rekordy trafiają przez QueueHandler do kolejki, a zapis na stdout robi
+QueueListener we własnym wątku – pętla zdarzeń nigdy nie czeka na I/O.
+Kontekst sesji (session_id, player) płynie przez contextvars: bind() przy
+loginie ustawia go dla całego handlera WebSocket i zadań z niego tworzonych.
+Zdarzenia masowe logujemy z extra={"sampled": True} – przechodzi ich
+LOG_SAMPLE_RATE. LOG_FORMAT=json daje jeden obiekt JSON na linię.
+"""
+import os, sys, json, queue, random, atexit, logging, contextvars
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")            # text | json
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+LOG_BUFFER = int(os.getenv("LOG_BUFFER", "10000"))
+
+session_ctx: contextvars.ContextVar[str | None] = contextvars.ContextVar("session_id", default=None)
+player_ctx: contextvars.ContextVar[str | None] = contextvars.ContextVar("player", default=None)
+
+log = logging.getLogger("game_server")
+
+
+def bind(session_id: str | None = None, player: str | None = None):
+    if session_id is not None:
+        session_ctx.set(session_id)
+    if player is not None:
+        player_ctx.set(player)
+
+
+class _ContextFilter(logging.Filter):
+    def filter(self, record):
+        if getattr(record, "session_id", None) is None:
+            record.session_id = session_ctx.get()
+        if getattr(record, "player", None) is None:
+            record.player = player_ctx.get()
+        return True
+
+
+class _SampleFilter(logging.Filter):
+    def filter(self, record):
+        return not getattr(record, "sampled", False) or random.random() < LOG_SAMPLE_RATE
+
+
+class _DroppingQueueHandler(QueueHandler):
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # writer nie nadąża – gubimy rekord zamiast blokować pętlę
+            _DroppingQueueHandler.dropped += 1
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record):
+        msg = f"[GameServer] {record.levelname} {record.getMessage()}"
+        ctx = " ".join(f"{k}={v}" for k in ("session_id", "player") if (v := getattr(record, k, None)))
+        if ctx:
+            msg += f" ({ctx})"
+        if record.exc_info:
+            msg += "\n" + self.formatException(record.exc_info)
+        return msg
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        out = {"ts": round(record.created, 3), "level": record.levelname, "logger": record.name,
+               "msg": record.getMessage()}
+        for k in ("session_id", "player"):
+            if (v := getattr(record, k, None)) is not None:
+                out[k] = v
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False)
+
+
+_listener: QueueListener | None = None
+
+
+def setup():
+    global _listener
+    if _listener is not None:
+        return
+    out = logging.StreamHandler(sys.stdout)
+    out.setFormatter(_JsonFormatter() if LOG_FORMAT == "json" else _TextFormatter())
+    q: queue.Queue = queue.Queue(maxsize=LOG_BUFFER)
+    handler = _DroppingQueueHandler(q)
+    # kontekst i próbkowanie muszą zadziałać w wątku wywołującym (contextvars), nie w listenerze
+    handler.addFilter(_ContextFilter())
+    handler.addFilter(_SampleFilter())
+    log.addHandler(handler)
+    log.setLevel(LOG_LEVEL)
+    log.propagate = False
+    _listener = QueueListener(q, out, respect_handler_level=False)
+    _listener.start()
+    atexit.register(shutdown)
+
+
+def shutdown():
+    global _listener
+    if _listener is not None:
+        _listener.stop()   # dopisuje to, co zostało w kolejce
+        _listener = None
+
+
+def stats() -> dict:
+    return {"level": logging.getLevelName(log.level), "dropped": _DroppingQueueHandler.dropped}
@@ -0,0 +1,63 @@
+"""
+Pre-warm mediów scenariuszy skryptowanych.
+
+Narracja każdej tury scenariusza jest znana z góry, więc dla scenariuszy
+w użyciu (domyślny SCENARIO i sesji w pamięci – przy starcie i hot reload)
+oraz przy wejściu do sesji ze scenariuszem syntezujemy w tle głos wszystkich
+tur, które jeszcze go nie mają – najwyżej SCENARIO_PREWARM_CONCURRENCY naraz.
+Wywołania TTS idą przez osobny breaker ("tts_prewarm"), nie przez breaker tur. Zamknięcie tury czyta gotowy wynik ze
+Scenario.voice; jeśli pre-warm nie zdążył, tura woła TTS jak dotąd.
+(Publiczne URL-e obrazów scenariusz rozwiązuje już przy kompilacji.)
+"""
+import os, asyncio, logging
+from scenarios import Scenario
+
+log = logging.getLogger("game_server.prewarm")
+
+SCENARIO_PREWARM = os.getenv("SCENARIO_PREWARM", "1") == "1"
+SCENARIO_PREWARM_CONCURRENCY = int(os.getenv("SCENARIO_PREWARM_CONCURRENCY", "2"))
+
+
+class ScenarioPrewarmer:
+    def __init__(self, synthesize, concurrency: int = SCENARIO_PREWARM_CONCURRENCY):
+        self._synthesize = synthesize   # async (scenario, turn_id, text) -> audio_url | None
+        self._sem = asyncio.Semaphore(max(1, concurrency))
+        self._pending: set[tuple[int, int]] = set()   # (id(scenario), turn_id)
+        self._tasks: set[asyncio.Task] = set()
+        self.warmed = 0
+        self.failed = 0
+
+    def schedule(self, scenario: Scenario | None):
+        if not SCENARIO_PREWARM or scenario is None:
+            return
+        for tid, turn in scenario.turns.items():
+            key = (id(scenario), tid)
+            if tid in scenario.voice or key in self._pending:
+                continue
+            self._pending.add(key)
+            task = asyncio.create_task(self._warm(scenario, tid, turn["narration"], key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _warm(self, scenario: Scenario, turn_id: int, text: str, key: tuple):
+        try:
+            async with self._sem:
+                url = await self._synthesize(scenario, turn_id, text)
+            if url:
+                scenario.voice[turn_id] = url
+                self.warmed += 1
+        except Exception as e:
+            # bez nagrania tura i tak zawoła TTS; kolejna próba przy następnym schedule()
+            self.failed += 1
+            log.warning("Scenario %s turn %s pre-warm failed: %s", scenario.name, turn_id, e)
+        finally:
+            self._pending.discard(key)
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {"enabled": SCENARIO_PREWARM, "pending": len(self._pending),
+                "warmed": self.warmed, "failed": self.failed}
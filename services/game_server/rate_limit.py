@@ -0,0 +1,67 @@
+"""
+Limit akcji graczy po stronie Game Servera.
+
+Token bucket per gracz o tej samej polityce co ratelimit() Supervisora
+(jedna akcja na RATE_LIMIT_SECONDS, bez zapasu przy RATE_LIMIT_BURST=1) –
+nadmiarowa akcja nie kosztuje już rundy HTTP do Supervisora. Bucket może
+zejść poniżej zera: to akcje zarezerwowane na później (tryb queue).
+"""
+import os, time
+
+RATE_LIMIT_SECONDS = float(os.getenv("RATE_LIMIT_SECONDS", "1.0"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "1"))
+# reject – od razu ramka rate_limited; queue – akcja czeka na token (najwyżej RATE_LIMIT_MAX_WAIT s)
+RATE_LIMIT_MODE = os.getenv("RATE_LIMIT_MODE", "reject")
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "5"))
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "stamp")
+
+    def __init__(self, tokens: float, stamp: float):
+        self.tokens = tokens
+        self.stamp = stamp
+
+
+class RateLimiter:
+    def __init__(self, seconds: float = RATE_LIMIT_SECONDS, burst: int = RATE_LIMIT_BURST):
+        self.seconds = seconds
+        self.burst = burst
+        self._buckets: dict[str, TokenBucket] = {}
+        self.limited = 0
+
+    def acquire(self, key: str, max_wait: float = 0.0) -> float | None:
+        """Opóźnienie (s), po którym akcja może iść dalej (0 = od razu); None = odrzucić."""
+        if self.seconds <= 0:
+            return 0.0
+        now = time.monotonic()
+        b = self._buckets.get(key)
+        if b is None:
+            b = self._buckets[key] = TokenBucket(self.burst, now)
+        else:
+            b.tokens = min(self.burst, b.tokens + (now - b.stamp) / self.seconds)
+            b.stamp = now
+        delay = 0.0 if b.tokens >= 1 else (1 - b.tokens) * self.seconds
+        if delay > max_wait:
+            self.limited += 1
+            return None
+        b.tokens -= 1
+        return delay
+
+    def retry_after(self, key: str) -> float:
+        b = self._buckets.get(key)
+        if b is None:
+            return 0.0
+        tokens = min(self.burst, b.tokens + (time.monotonic() - b.stamp) / self.seconds)
+        return max(0.0, (1 - tokens) * self.seconds)
+
+    def prune(self):
+        # pełne buckety niczego nie pamiętają – można je zapomnieć
+        now = time.monotonic()
+        full = [k for k, b in self._buckets.items() if b.tokens + (now - b.stamp) / self.seconds >= self.burst]
+        for k in full:
+            del self._buckets[k]
+
+    def stats(self) -> dict:
+        return {"seconds": self.seconds, "burst": self.burst, "mode": RATE_LIMIT_MODE,
+                "players": len(self._buckets), "limited": self.limited}
@@ -0,0 +1,121 @@
+"""
+Rejestr scenariuszy skryptowanych Game Servera.
+
+Ładuje wszystkie SCENARIOS_DIR/*/scenario.json, waliduje je przy wczytaniu
+i kompiluje tury do słownika turn_id -> tura (lookup O(1) w każdej turze).
+Nazwą scenariusza jest nazwa katalogu (np. case_zero). watch() co
+SCENARIO_RELOAD_INTERVAL s przeładowuje zmienione pliki bez restartu serwera;
+błędny plik nie podmienia poprzedniej, poprawnej wersji. Scenario.voice trzyma
+gotowe nagrania narracji (voice_audio z pliku albo z pre-warmu – prewarm.py).
+"""
+import os, json, glob, asyncio, logging
+
+log = logging.getLogger("game_server.scenarios")
+
+SCENARIOS_DIR = os.getenv("SCENARIOS_DIR", "/app/scenarios")
+SCENARIO_RELOAD_INTERVAL = float(os.getenv("SCENARIO_RELOAD_INTERVAL", "5"))
+
+
+class ScenarioError(ValueError):
+    pass
+
+
+class Scenario:
+    def __init__(self, name: str, path: str, mtime: float, data: dict, turns: dict[int, dict]):
+        self.name = name
+        self.path = path
+        self.mtime = mtime
+        self.title = data.get("name", name)
+        self.version = data.get("version")
+        self.turns = turns
+        # turn_id -> audio_url narracji; nowa wersja pliku zaczyna od zera (chyba że ma voice_audio)
+        self.voice: dict[int, str] = {tid: t["voice_audio"] for tid, t in turns.items() if t.get("voice_audio")}
+
+    def turn(self, turn_id: int) -> dict | None:
+        return self.turns.get(turn_id)
+
+    def info(self) -> dict:
+        return {"name": self.name, "title": self.title, "version": self.version, "turns": len(self.turns),
+                "voiced": len(self.voice)}
+
+
+def compile_scenario(name: str, path: str, asset_base: str = "") -> Scenario:
+    mtime = os.path.getmtime(path)
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or not isinstance(data.get("turns"), list) or not data["turns"]:
+        raise ScenarioError(f"{path}: 'turns' must be a non-empty list")
+    turns: dict[int, dict] = {}
+    for i, t in enumerate(data["turns"]):
+        tid = t.get("turn_id") if isinstance(t, dict) else None
+        if not isinstance(tid, int) or isinstance(tid, bool) or tid < 1:
+            raise ScenarioError(f"{path}: turns[{i}] has invalid turn_id")
+        if tid in turns:
+            raise ScenarioError(f"{path}: duplicate turn_id {tid}")
+        if not isinstance(t.get("narration"), str):
+            raise ScenarioError(f"{path}: turn {tid} has no narration")
+        image = t.get("image")
+        if image is not None and not isinstance(image, str):
+            raise ScenarioError(f"{path}: turn {tid} image must be a string")
+        # ścieżki /assets/ rozwiązujemy raz, przy kompilacji
+        if image and image.startswith("/assets/"):
+            image = f"{asset_base}{image}"
+        turns[tid] = {**t, "image": image}
+    return Scenario(name, path, mtime, data, turns)
+
+
+class ScenarioRegistry:
+    def __init__(self, root: str = SCENARIOS_DIR, asset_base: str = ""):
+        self.root = root
+        self.asset_base = asset_base
+        self.scenarios: dict[str, Scenario] = {}
+        self._failed: dict[str, float] = {}   # path -> mtime pliku, którego nie dało się wczytać
+
+    def get(self, name: str | None) -> Scenario | None:
+        return self.scenarios.get(name) if name else None
+
+    def names(self) -> list[str]:
+        return sorted(self.scenarios)
+
+    def reload(self) -> list[str]:
+        """Wczytuje nowe i zmienione scenariusze, usuwa skasowane. Zwraca nazwy przeładowanych."""
+        found = {}
+        for path in glob.glob(os.path.join(self.root, "*", "scenario.json")):
+            found[os.path.basename(os.path.dirname(path))] = path
+        # budujemy nowy słownik i podmieniamy go w całości – czytelnicy w pętli zdarzeń nie widzą stanu pośredniego
+        scenarios = {name: sc for name, sc in self.scenarios.items() if name in found}
+        changed = []
+        for name, path in found.items():
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue  # plik zniknął w trakcie skanu
+            cur = scenarios.get(name)
+            if (cur and cur.path == path and cur.mtime == mtime) or self._failed.get(path) == mtime:
+                continue
+            try:
+                scenarios[name] = compile_scenario(name, path, self.asset_base)
+            except Exception as e:
+                # zostaje poprzednia wersja (jeśli była); ten sam plik nie jest ponawiany do następnej zmiany
+                self._failed[path] = mtime
+                log.warning("Cannot load scenario %s: %s", path, e)
+                continue
+            self._failed.pop(path, None)
+            changed.append(name)
+            log.info("Scenario %s loaded, turns=%d", name, len(scenarios[name].turns))
+        for name in set(self.scenarios) - set(found):
+            log.info("Scenario %s removed", name)
+        self.scenarios = scenarios
+        return changed
+
+    async def watch(self, interval: float = SCENARIO_RELOAD_INTERVAL, on_change=None):
+        """on_change(nazwy) – wołane w pętli zdarzeń po wczytaniu nowych/zmienionych scenariuszy."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                changed = await asyncio.to_thread(self.reload)
+            except Exception as e:
+                log.error("Scenario reload error: %s", e)
+                continue
+            if changed and on_change:
+                on_change(changed)
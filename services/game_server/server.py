@@ -1,9 +1,29 @@
-import os, json, asyncio
-import httpx
+import os, json, copy, asyncio
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Body, HTTPException, Header
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from game_state import GameState
-
+import logs
+from logs import log
+import downstream
+from log_shipper import LogShipper
+from session_store import make_store
+from scenarios import ScenarioRegistry
+from prewarm import ScenarioPrewarmer
+from timer_wheel import TimerWheel
+import connections
+import telemetry
+from telemetry import span
+from connections import ClientConn, coalesce_key
+from wire import Frame, negotiate
+from views import FrameViews, VIEW, AUDIENCE, world_view
+from singleflight import text_key
+import work_queue
+from work_queue import Job, WorkQueues
+from rate_limit import RateLimiter, RATE_LIMIT_MODE, RATE_LIMIT_MAX_WAIT
+from spectators import SpectatorHub, SPECTATOR_OUTBOX_MAX
+
+logs.setup()
 app = FastAPI(title="Game Server", version="1.1.0")
 
 # CORS
@@ -19,6 +39,7 @@ app.add_middleware(
 # ENV
 TTS_URL = os.getenv("TTS_URL", "http://tts_gateway:8001/speak")
 ADMIN_URL = os.getenv("ADMIN_URL", "http://admin_service:8002/log")
+ADMIN_BULK_URL = os.getenv("ADMIN_BULK_URL", ADMIN_URL.rstrip("/") + "/bulk")
 AI_URL = os.getenv("AI_URL", "http://ai_orchestrator:8003/orchestrate")
 AI_BOT_URL = os.getenv("AI_BOT_URL", "http://ai_orchestrator:8003/bot_action")
 SUPERVISOR_URL = os.getenv("SUPERVISOR_URL", "http://supervisor_service:8005/validate")
@@ -26,36 +47,48 @@ SUPERVISOR_URL = os.getenv("SUPERVISOR_URL", "http://supervisor_service:8005/val
 STORY_MODE = os.getenv("STORY_MODE","0") == "1"
 STORY_URL  = os.getenv("STORY_URL","http://ai_orchestrator:8003/story_step")
 VISION_URL = os.getenv("VISION_URL","http://vision_selector:8004/match")
+# Deadline (s) etapów mediów po story step – wolny etap daje null zamiast opóźniać story_update
+STORY_TTS_DEADLINE = float(os.getenv("STORY_TTS_DEADLINE", "10"))
+STORY_VISION_DEADLINE = float(os.getenv("STORY_VISION_DEADLINE", "5"))
+# Tryb progresywny: story_update od razu z tekstem, media dochodzą ramkami media_ready
+STORY_PROGRESSIVE_DEFAULT = os.getenv("STORY_PROGRESSIVE_DEFAULT", "0") == "1"
+# Protokół delta: ramki niosą tylko zmienione ścieżki stanu (pełny snapshot przy login/rejoin)
+STATE_DELTA_DEFAULT = os.getenv("STATE_DELTA_DEFAULT", "0") == "1"
+# Nowa akcja gracza anuluje jego trwający (jeszcze niezapisany) krok fabuły
+STORY_SUPERSEDE = os.getenv("STORY_SUPERSEDE", "0") == "1"
 
 PUBLIC_TTS_BASE = os.getenv("PUBLIC_TTS_BASE", "http://localhost:8001")
 PUBLIC_VISION_BASE = os.getenv("PUBLIC_VISION_BASE", "http://localhost:8004")
 ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
 
+# Domyślny scenariusz sesji (katalog w SCENARIOS_DIR); nieznana nazwa (np. "ai") => narracja z AI
 SCENARIO = os.getenv("SCENARIO", "case_zero")
-SCENARIO_PATH = "/app/scenarios/case_zero/scenario.json"
 
 TURN_TIMEOUT_SECONDS = float(os.getenv("TURN_TIMEOUT_SECONDS", "90"))
+SESSION_REAP_INTERVAL = float(os.getenv("SESSION_REAP_INTERVAL", "60"))
 
 SINGLE_PLAYER_DEFAULT = os.getenv("SINGLE_PLAYER_DEFAULT", "0") == "1"
 BOT_NAME = os.getenv("BOT_NAME", "PartnerBot")
 BOT_THINK_MS = int(os.getenv("BOT_THINK_MS", "300"))
 BOT_PERSONA = os.getenv("BOT_PERSONA", "ostrożny śledczy")
+# Akcja bota liczona (i walidowana) w tle zaraz po narracji poprzedniej tury
+BOT_SPECULATE = os.getenv("BOT_SPECULATE", "1") == "1"
 
-# Sesje i ich struktury pomocnicze
-sessions: dict[str, GameState] = {}
-session_locks: dict[str, asyncio.Lock] = {}
-turn_timers: dict[str, asyncio.Task] = {}
+# Sesje i ich struktury pomocnicze (SESSION_STORE=memory|redis)
+store = make_store()
+sessions: dict[str, GameState] = store.sessions  # lokalne kopie sesji (z gniazdami tej repliki)
+service_tasks: list[asyncio.Task] = []   # reaper sesji, przeładowanie scenariuszy
+work_queues = WorkQueues()   # akcje graczy – po kolei w obrębie sesji
+action_limiter = RateLimiter()   # ta sama polityka co ratelimit() Supervisora
+spectators = SpectatorHub()   # widzowie sesji – poza state.players
 
-case_zero_data = None
+scenario_registry = ScenarioRegistry(asset_base=PUBLIC_VISION_BASE)
+# głos tur scenariuszy syntezowany z góry, w tle
+# własny breaker – nieudany pre-warm (TTS jeszcze wstaje) nie otwiera "tts" dla tur graczy
+prewarmer = ScenarioPrewarmer(lambda scenario, turn_id, text: _tts(scenario.name, turn_id, text, guard="tts_prewarm"))
 
-def load_case_zero():
-    global case_zero_data
-    try:
-        with open(SCENARIO_PATH, "r", encoding="utf-8") as f:
-            case_zero_data = json.load(f)
-            print(f"[GameServer] Case Zero loaded, turns={len(case_zero_data.get('turns', []))}")
-    except Exception as e:
-        print(f"[GameServer] WARN: Cannot load scenario {SCENARIO_PATH}: {e}")
+# Logi tur do Admin – w tle, paczkami (nigdy na ścieżce tury ani pod lockiem sesji)
+log_shipper = LogShipper(ADMIN_BULK_URL, {"X-Admin-Token": ADMIN_TOKEN} if ADMIN_TOKEN else {})
 
 def build_public_image(url_or_path: str | None) -> str | None:
     if not url_or_path:
@@ -66,17 +99,86 @@ def build_public_image(url_or_path: str | None) -> str | None:
 
 @app.on_event("startup")
 async def on_startup():
-    if SCENARIO == "case_zero":
-        load_case_zero()
+    downstream.start()
+    log_shipper.start()
+    await store.start(deliver_remote)
+    await asyncio.to_thread(scenario_registry.reload)
+    _prewarm_scenarios(scenario_registry.names())
+    service_tasks.append(asyncio.create_task(_session_reaper()))
+    service_tasks.append(asyncio.create_task(scenario_registry.watch(on_change=_prewarm_scenarios)))
+    turn_timers.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    for task in service_tasks:
+        task.cancel()
+    await work_queues.stop()
+    await prewarmer.stop()
+    await turn_timers.stop()
+    await log_shipper.stop()
+    await store.close()
+    await downstream.close()
+    logs.shutdown()
+
+def _prewarm_scenarios(names: list[str]):
+    # tylko scenariusze w użyciu (domyślny i sesji w pamięci) – reszta dopiero przy loginie do niej
+    in_use = {SCENARIO, *(state.scenario for state in sessions.values())}
+    for name in names:
+        if name in in_use:
+            prewarmer.schedule(scenario_registry.get(name))
+
+@app.get("/scenarios")
+def list_scenarios():
+    return {"default": SCENARIO, "scenarios": [scenario_registry.scenarios[n].info() for n in scenario_registry.names()]}
+
+@app.get("/timers")
+def list_timers(admin_token: str = Header(default=None, alias="X-Admin-Token")):
+    if ADMIN_TOKEN and admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return {**turn_timers.stats(), "pending": turn_timers.pending()}
 
 @app.get("/health")
 def health():
     return {
         "status": "ok",
         "sessions": len(sessions),
+        "session_store": store.name,
+        "sessions_evicted": store.evicted,
         "scenario": SCENARIO,
-        "turn_timers": len(turn_timers)
+        "scenarios": scenario_registry.names(),
+        "turn_timers": turn_timers.stats(),
+        "admin_log": log_shipper.stats(),
+        "logging": logs.stats(),
+        "connections": connections.stats(),
+        "work_queues": work_queues.stats(),
+        "rate_limit": action_limiter.stats(),
+        "singleflight": downstream.flights.stats(),
+        "breakers": downstream.breaker_stats(),
+        "spectators": spectators.stats(),
+        "prewarm": prewarmer.stats()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # format tekstowy Prometheusa; wartości zbierane w chwili scrape z tych samych stats() co /health
+    conn = connections.stats()
+    breakers = downstream.breaker_stats()
+    gauges = {
+        "game_server_sessions": ("gauge", "Sesje w pamięci repliki", len(sessions)),
+        "game_server_sessions_evicted_total": ("counter", "Sesje usunięte z pamięci", store.evicted),
+        "game_server_connections": ("gauge", "Otwarte połączenia WebSocket", conn["open"]),
+        "game_server_outbox_queued": ("gauge", "Ramki czekające w kolejkach wysyłki", conn["queued"]),
+        "game_server_turn_timers_armed": ("gauge", "Uzbrojone timery tur", turn_timers.stats()["armed"]),
+        "game_server_work_queue_jobs": ("gauge", "Zadania w kolejkach sesji", work_queues.stats()["jobs"]),
+        "game_server_admin_log_queued": ("gauge", "Wpisy czekające na wysyłkę do Admin", log_shipper.stats()["queued"]),
+        "game_server_rate_limited_total": ("counter", "Akcje odrzucone lub opóźnione przez limit", action_limiter.stats()["limited"]),
+        "game_server_spectators": ("gauge", "Podłączeni widzowie sesji", spectators.stats()["viewers"]),
+        "game_server_spectators_rejected_total": ("counter", "Widzowie odrzuceni przez limit sesji", spectators.rejected),
+        "game_server_singleflight_in_flight": ("gauge", "Współdzielone wywołania w toku", downstream.flights.stats()["in_flight"]),
+        "game_server_breaker_open": ("gauge", "Obwód usługi otwarty (1) lub half-open (0.5)",
+                                     {("service", n): {"open": 1, "half_open": 0.5}.get(b["state"], 0) for n, b in breakers.items()}),
     }
+    return PlainTextResponse(telemetry.render(gauges), media_type="text/plain; version=0.0.4")
 
 @app.post("/override")
 async def override(
@@ -102,10 +204,8 @@ async def override(
     if not session_id or turn is None:
         raise HTTPException(status_code=400, detail="session_id and turn required")
 
-    state = sessions.get(session_id)
-    if not state:
-        # brak sesji – nadal logujemy do Admin i kończymy 200
-        state = None
+    state = await store.load(session_id, create=False)
+    # brak sesji – nadal logujemy do Admin i kończymy 200
 
     # zbuduj override payload (tylko pola, które przyszły)
     ov = {
@@ -123,18 +223,16 @@ async def override(
         await broadcast(state, ov)
 
     # log do Admin (jako techniczny log override)
-    headers = {"X-Admin-Token": ADMIN_TOKEN} if ADMIN_TOKEN else {}
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            await client.post(ADMIN_URL, headers=headers, json={
-                "session_id": session_id,
-                "turn": int(turn),
-                "actions": {"override": True},
-                "text": "[override] Admin updated media" + (f" image={payload.get('image')}" if payload.get('image') else ""),
-                "image": payload.get("image",""),
-                "audio": payload.get("voice_audio","")
-            })
-    except Exception:
+        log_shipper.enqueue({
+            "session_id": session_id,
+            "turn": int(turn),
+            "actions": {"override": True},
+            "text": "[override] Admin updated media" + (f" image={payload.get('image')}" if payload.get('image') else ""),
+            "image": payload.get("image",""),
+            "audio": payload.get("voice_audio","")
+        })
+    except (TypeError, ValueError):
         pass
 
     return {"status":"ok"}
@@ -148,273 +246,471 @@ async def image_update(payload: dict = Body(...), admin_token: str = Header(defa
     image = payload.get("image")
     if not session_id or turn is None or not image:
         raise HTTPException(status_code=400, detail="session_id, turn, image required")
-    state = sessions.get(session_id)
+    state = await store.load(session_id, create=False)
     msg = {"type":"image_update", "session_id":session_id, "turn_id":turn, "image": image}
     if state and state.players:
         await broadcast(state, msg)
     return {"status":"ok"}
 
 async def broadcast(state: GameState, payload: dict):
-    dead = []
-    for name, ws in state.players.items():
+    # serializacja raz na kodowanie dla wszystkich gniazd
+    with span("broadcast"):
+        # numer ramki z licznika sesji w magazynie (wspólny dla replik); ramka do bufora replay
+        # jako tekst JSON z chwili wysyłki – klient po reconnect podaje last_seq i dostaje brakujące
         try:
-            await ws.send_text(json.dumps(payload))
-        except Exception:
-            dead.append(name)
-    for name in dead:
-        state.players.pop(name, None)
-
-async def process_story_step(state, user_text: str, sup_result: dict | None = None):
-    print(f"[GameServer] process_story_step: user_text='{user_text}', sup_result={sup_result}")
-    # 1) LLM story step (z sup context)
-    async with httpx.AsyncClient(timeout=30) as client:
-        sr = await client.post(STORY_URL, json={
-            "state": state.to_json(),
-            "player_input": user_text,
-            "supervisor": sup_result or {}
-        })
-        story = sr.json()
+            payload["seq"] = await store.next_seq(state)
+            frame = Frame(payload)
+            await store.remember_frame(state, payload["seq"], frame.text)
+        except Exception as e:
+            log.warning("Frame sequencing error: %s", e)
+            frame = Frame(payload)
+        if store.distributed:
+            # gracze podłączeni do innych replik dostaną ramkę przez pub/sub
+            try:
+                await store.publish(state.session_id, frame.text)
+            except Exception as e:
+                log.warning("Broadcast publish error: %s", e)
+        _deliver_local(state, frame)
 
-    # 2) TTS
-    audio_url = None
+async def deliver_remote(session_id: str, data: str):
+    # ramka z innej repliki – tylko do gniazd trzymanych tutaj
+    state = sessions.get(session_id)
+    if state:
+        _deliver_local(state, Frame(json.loads(data), data))
+    else:
+        # sesji nie ma tu w pamięci, ale mogą ją oglądać widzowie tej repliki
+        spectators.publish(session_id, FrameViews(Frame(json.loads(data), data)))
+
+def _deliver_local(state: GameState, frame: Frame):
+    # tylko kolejkowanie – wysyłkę robi writer każdego połączenia, wolny klient nie hamuje reszty
+    views = FrameViews(frame)
+    key = coalesce_key(frame.payload)
+    # bot i gracze z innych replik nie mają tu gniazda (None) – pomijamy, nie usuwamy
+    for name, conn in list(state.players.items()):
+        if conn is None:
+            continue
+        out = views.for_conn(conn)   # None – ramka innego trybu mediów
+        if out is None or conn.send(out, key):
+            continue
+        # zamknięte/przepełnione połączenie – usuń, jeśli gracz nie podpiął nowego (rejoin)
+        if state.players.get(name) is conn:
+            state.remove_player(name)
+            if store.distributed:
+                _spawn(_forget_player(state, name))
+    # widzowie po graczach – te same ramki widoków, bez ponownego kodowania
+    spectators.publish(state.session_id, views)
+
+async def _forget_player(state: GameState, name: str):
+    # usunięcie gracza musi trafić do wspólnego stanu, inaczej wróci przy refresh
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            tts = await client.post(TTS_URL, json={"text": story.get("text",""), "turn_id": state.turn_id, "session_id": state.session_id})
-            audio_url = tts.json().get("audio_url")
-    except Exception:
-        audio_url = None
+        async with get_lock(state.session_id):
+            await store.refresh(state)
+            if state.players.get(name) is None:
+                state.remove_player(name)
+                await store.save(state)
+    except Exception as e:
+        log.warning("Cannot remove player %s from shared session: %s", name, e)
 
-    # 3) Obraz (Vision /match po vision_query)
-    image_url = None
+
+async def _with_deadline(coro, seconds: float, stage: str):
+    """Etap mediów: po przekroczeniu deadline'u lub błędzie zwraca None (brak medium) zamiast blokować turę."""
     try:
-        vision_query = story.get("vision_query") or story.get("text","")
-        print(f"[GameServer] Vision query: {vision_query}")
-        async with httpx.AsyncClient(timeout=10) as client:
-            mr = await client.post(VISION_URL, json={"text": vision_query})
-            image_rel = mr.json().get("image_url")
-            print(f"[GameServer] Vision response: {image_rel}")
-            image_url = f"{PUBLIC_VISION_BASE}{image_rel}" if image_rel and image_rel.startswith("/assets/") else image_rel
-            print(f"[GameServer] Final image_url: {image_url}")
+        return await asyncio.wait_for(coro, timeout=seconds)
+    except asyncio.TimeoutError:
+        log.warning("%s deadline %ss exceeded – media=null", stage, seconds)
     except Exception as e:
-        print(f"[GameServer] Vision error: {e}")
-        image_url = None
-
-    # 4) Zapis i broadcast
-    state.apply_storystep(story)
-    state.apply_narration(story.get("text",""))
+        log.warning("%s error: %s", stage, e)
+    return None
+
+async def _story_tts(session_id: str, turn_id: int, story: dict) -> str | None:
+    return await _tts(session_id, turn_id, story.get("text",""))
+
+async def _story_vision(story: dict) -> str | None:
+    # Obraz (Vision /match po vision_query)
+    vision_query = story.get("vision_query") or story.get("text","")
+    log.debug("Vision query: %s", vision_query)
+    with span("vision"):
+        mr = await downstream.post("vision", VISION_URL, dedupe=text_key(vision_query), json={"text": vision_query})
+    image_rel = mr.json().get("image_url")
+    log.debug("Vision response: %s", image_rel)
+    image_url = f"{PUBLIC_VISION_BASE}{image_rel}" if image_rel and image_rel.startswith("/assets/") else image_rel
+    log.debug("Final image_url: %s", image_url)
+    return image_url
+
+async def process_story_step(state, user_text: str, sup_result: dict | None = None) -> bool:
+    """False, gdy Orchestrator nie dał kroku fabuły (tura bez zmian – wołający powiadamia gracza)."""
+    log.debug("process_story_step: user_text=%r, sup_result=%s", user_text, sup_result)
+    with span("turn"):
+        return await _story_step(state, user_text, sup_result)
+
+async def _story_step(state, user_text: str, sup_result: dict | None) -> bool:
+    # jak _close_turn: zdjęcie stanu pod lockiem, generowanie bez locka, commit pod lockiem
+    sid = state.session_id
+    async with get_lock(sid):
+        await store.refresh(state)
+        game_state = state.to_json_bytes()
+        turn_id = state.turn_id
 
+    # 1) LLM story step (z sup context)
+    try:
+        with span("story"):
+            sr = await downstream.post_state("ai", STORY_URL, "state", game_state, {
+                "player_input": user_text,
+                "supervisor": sup_result or {}
+            })
+        sr.raise_for_status()
+        story = sr.json()
+    except Exception as e:
+        # otwarty breaker "ai", błąd transportu lub odpowiedź 4xx/5xx
+        log.warning("Story step failed: %s", e)
+        return False
+
+    # ramki poprzedniego kroku (media, klasyczny story_update) wychodzą przed ramkami tego
+    prev = _story_media.get(sid)
+    if prev is not None:
+        await asyncio.wait((prev,))
+
+    # 2) Zapis i broadcast tekstu – na świeżym stanie, zmiany innych replik (login, graph_update) zostają
+    async with get_lock(sid):
+        await store.refresh(state)
+        if state.turn_id != turn_id:
+            log.info("Turn %s already closed – discarding story step", turn_id)
+            return True
+        work_queue.commit_point()
+        classic = await _story_commit(state, story, turn_id)
+        await store.save(state)
+
+    # 3) TTS i obraz w tle – kolejna akcja gracza nie czeka na media tej tury
+    task = _story_media[sid] = _spawn(_push_story_media(state, story, turn_id, classic))
+    task.add_done_callback(lambda t: _story_media.pop(sid) if _story_media.get(sid) is t else None)
+    return True
+
+def _story_payload(state: GameState, story: dict, turn_id: int, image_url, audio_url, sfx) -> dict:
     payload = {
         "type":"story_update",
         "session_id": state.session_id,
-        "turn_id": state.turn_id,
+        "turn_id": turn_id,
         "text": story.get("text",""),
         "whispers": story.get("whispers",[]),
         "tags": story.get("tags",{}),
         "shot": story.get("shot"),
-        "metrics": state.metrics,
         "metrics_delta": story.get("state_diff",{}).get("metrics_delta",{}),
-        "inventory": state.inventory,
-        "location": getattr(state, "location", "office"),
-        "relations": state.relations,
-        "casefile": state.casefile,
         "reframed": story.get("reframed", False),
         "reframed_from": story.get("reframed_from"),
         "reframed_to": story.get("reframed_to"),
         "image": image_url,
         "voice_audio": audio_url,
-        "sfx": story.get("sfx_urls", [])
+        "sfx": sfx
     }
+    telemetry.attach_debug(payload)
+    # pełne słowniki albo delta – per połączenie (views.FrameViews)
+    payload[VIEW] = world_view(state, STORY_STATE_FIELDS, spectators.acked(state.session_id))
+    return payload
+
+# pola stanu w story_update dla klientów bez protokołu delta
+STORY_STATE_FIELDS = ("metrics", "inventory", "location", "relations", "casefile")
+
+def _state_snapshot(state: GameState) -> dict:
+    return {"type": "state_snapshot", "session_id": state.session_id, "turn_id": state.turn_id,
+            "state_version": state.state_version, "state": state.world_snapshot()}
+
+# referencje do zadań w tle (asyncio trzyma tylko słabe)
+_bg_tasks: set[asyncio.Task] = set()
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _bg_tasks.add(task)
+    task.add_done_callback(_bg_tasks.discard)
+    return task
+
+# session_id -> media ostatniego kroku fabuły w tle
+_story_media: dict[str, asyncio.Task] = {}
+
+async def _story_commit(state: GameState, story: dict, turn_id: int) -> dict:
+    """
+    Klienci progresywni: od razu tekst + diff stanu (bez mediów), potem osobne ramki
+    media_ready (voice_audio, image, sfx) z tym samym turn_id – każda, gdy tylko jest gotowa.
+    Klienci klasyczni: jeden story_update z mediami – zwracany do _push_story_media.
+    """
+    sfx = story.get("sfx_urls", []) or []
+    state.apply_storystep(story)
+    state.apply_narration(story.get("text",""))
+    payload = _story_payload(state, story, turn_id, None, None, [])
+    # widok stanu z chwili zapisu – ramka klasyczna wyjdzie dopiero po mediach
+    classic = {**payload, VIEW: copy.deepcopy(payload[VIEW]), "sfx": sfx, AUDIENCE: "classic"}
+    payload["media_pending"] = ["voice_audio", "image"] + (["sfx"] if sfx else [])
+    payload[AUDIENCE] = "progressive"
     await broadcast(state, payload)
     state.next_turn()
+    if sfx:
+        await broadcast(state, _media_ready(state, turn_id, "sfx", sfx))
+    return classic
+
+def _media_ready(state: GameState, turn_id: int, kind: str, value) -> dict:
+    # pole o nazwie kind (image/voice_audio/sfx) jak w story_update – klient może je po prostu scalić
+    return {"type": "media_ready", "session_id": state.session_id, "turn_id": turn_id, "kind": kind, kind: value,
+            AUDIENCE: "progressive"}
+
+async def _push_story_media(state: GameState, story: dict, turn_id: int, classic: dict):
+    async def _stage(kind: str, coro, seconds: float, name: str):
+        return kind, await _with_deadline(coro, seconds, name)
+    stages = [
+        _stage("voice_audio", _story_tts(state.session_id, turn_id, story), STORY_TTS_DEADLINE, "TTS"),
+        _stage("image", _story_vision(story), STORY_VISION_DEADLINE, "Vision"),
+    ]
+    for fut in asyncio.as_completed(stages):
+        kind, value = await fut
+        classic[kind] = value
+        # null też wysyłamy – klient wie, że medium tej tury nie będzie
+        await broadcast(state, _media_ready(state, turn_id, kind, value))
+    # klienci klasyczni: pełna ramka tury, gdy media są gotowe (albo minął ich deadline)
+    await broadcast(state, classic)
 
 def missing_players(state: GameState) -> list[str]:
     return [p for p in state.players.keys() if p not in state.actions]
 
-def get_lock(session_id: str) -> asyncio.Lock:
-    if session_id not in session_locks:
-        session_locks[session_id] = asyncio.Lock()
-    return session_locks[session_id]
-
-def cancel_timer(session_id: str):
-    task = turn_timers.get(session_id)
-    if task and not task.done():
-        task.cancel()
-    turn_timers.pop(session_id, None)
+def get_lock(session_id: str):
+    return store.lock(session_id)
+
+def _has_live_socket(state: GameState) -> bool:
+    return any(conn is not None and conn.alive for conn in state.players.values())
+
+async def _session_reaper():
+    # sesje bez aktywności i bez podłączonych graczy schodzą z pamięci (na dysk / zostają w Redis)
+    while True:
+        await asyncio.sleep(SESSION_REAP_INTERVAL)
+        action_limiter.prune()
+        for sid in store.idle_sessions():
+            state = sessions.get(sid)
+            # tykający timer tury nie blokuje zrzutu – po wygaśnięciu wczyta sesję z powrotem
+            if not state or _has_live_socket(state):
+                continue
+            try:
+                async with get_lock(sid):
+                    if sessions.get(sid) is state and not _has_live_socket(state):
+                        await store.evict(state)
+                        spec = _bot_speculation.pop(sid, None)
+                        if spec:
+                            spec[1].cancel()
+                        log.info("Evicted idle session", extra={"session_id": sid})
+            except Exception as e:
+                log.warning("Session eviction error: %s", e, extra={"session_id": sid})
+
+async def record_action(state: GameState, player: str, mapped: str):
+    closing = _closing_turns.get((state.session_id, state.turn_id))
+    if closing is not None:
+        # tura jest właśnie zamykana – ta akcja należy już do następnej
+        await closing.wait()
+    # zapis akcji pod lockiem na świeżym stanie – inna replika mogła ją właśnie zmienić
+    async with get_lock(state.session_id):
+        await store.refresh(state)
+        state.record_action(player, mapped)
+        await store.save(state)
+
+def cancel_timer(state: GameState):
+    turn_timers.cancel(state.session_id, state.turn_id)
 
 def ensure_timer(state: GameState):
-    # Uruchom timer tylko jeśli: 2 graczy jest w sesji, tura niezamknięta, timer nie istnieje
+    # Uzbrój timer tylko jeśli: 2 graczy jest w sesji, tura niezamknięta, timer tej tury nie tyka
     if len(state.players) < 2:
-        print(f"[GameServer] Timer not started: only {len(state.players)} players")
-        return
-    if state.session_id in turn_timers and not turn_timers[state.session_id].done():
-        print(f"[GameServer] Timer already running for session {state.session_id}")
         return
-    print(f"[GameServer] Starting timer for session {state.session_id}, turn {state.turn_id}, timeout {TURN_TIMEOUT_SECONDS}s")
-    async def _timeout_task(sid: str, turn_at_start: int):
-        try:
-            print(f"[GameServer] Timer task started for session {sid}, turn {turn_at_start}")
-            print(f"[GameServer] Sleeping for {TURN_TIMEOUT_SECONDS} seconds...")
-            await asyncio.sleep(TURN_TIMEOUT_SECONDS)
-            print(f"[GameServer] Timer expired for session {sid}, turn {turn_at_start}")
-            # Po timeout'cie spróbuj zamknąć turę na locku
-            lock = get_lock(sid)
-            async with lock:
-                cur_state = sessions.get(sid)
-                if not cur_state:
-                    print(f"[GameServer] Session {sid} no longer exists")
-                    return
-                print(f"[GameServer] Checking session {sid}: turn {cur_state.turn_id}, players {len(cur_state.players)}, actions {len(cur_state.actions)}")
-                # Jeśli tura się nie zmieniła i nadal brakuje akcji -> dopisz "wait"
-                if cur_state.turn_id == turn_at_start and len(cur_state.players) >= 2 and len(cur_state.actions) < len(cur_state.players):
-                    print(f"[GameServer] Adding wait actions for missing players in session {sid}")
-                    for p in missing_players(cur_state):
-                        cur_state.actions[p] = "wait"
-                    # UWAGA: tu wołamy wersję locked, bo trzymamy lock
-                    await process_turn_locked(cur_state)
-        except asyncio.CancelledError:
-            print(f"[GameServer] Timer cancelled for session {sid}")
-            pass
-        except Exception as e:
-            print(f"[GameServer] Timer error for session {sid}: {e}")
-        finally:
-            turn_timers.pop(sid, None)
-            print(f"[GameServer] Timer task finished for session {sid}")
+    if turn_timers.arm(state.session_id, state.turn_id, TURN_TIMEOUT_SECONDS):
+        log.debug("Turn timer armed: turn %s, timeout %ss", state.turn_id, TURN_TIMEOUT_SECONDS)
 
-    task = asyncio.create_task(_timeout_task(state.session_id, state.turn_id))
-    turn_timers[state.session_id] = task
-    print(f"[GameServer] Created timer task {task} for session {state.session_id}")
+async def on_turn_timeout(sid: str, turn_at_start: int):
+    telemetry.start_trace()
+    cur_state = await store.load(sid, create=False)
+    if not cur_state:
+        return
+    # Jeśli tura się nie zmieniła i nadal brakuje akcji -> dopisz "wait" i zamknij turę
+    async with get_lock(sid):
+        await store.refresh(cur_state)
+        if cur_state.turn_id != turn_at_start or len(cur_state.players) < 2 or len(cur_state.actions) >= len(cur_state.players):
+            return
+        log.info("Turn timer expired: turn %s, adding wait actions", turn_at_start, extra={"session_id": sid})
+        for p in missing_players(cur_state):
+            cur_state.record_action(p, "wait")
+        await store.save(cur_state)
+    await process_turn(cur_state, turn_at_start)
+
+# Jedno koło czasowe na wszystkie deadline'y tur, klucz (session_id, turn_id)
+turn_timers = TimerWheel(on_turn_timeout)
 
 def ensure_bot_present(state: GameState):
     if not state.single_player: return
     if state.bot_name and state.bot_name in state.players: return
     state.bot_name = state.bot_name or BOT_NAME
-    state.players[state.bot_name] = None
+    state.add_player(state.bot_name, None)
 
-async def maybe_bot_reply(state: GameState, last_human_mapped: str):
-    print(f"[GameServer] maybe_bot_reply called: single_player={state.single_player}, bot_name={state.bot_name}")
-    if not state.single_player or not state.bot_name: 
-        print(f"[GameServer] maybe_bot_reply: not single player or no bot name")
-        return
-    if state.bot_name in state.actions: 
-        print(f"[GameServer] maybe_bot_reply: bot already has action")
+# session_id -> (klucz stanu, zadanie z gotową akcją bota); ważne tylko dla tego samego klucza
+_bot_speculation: dict[str, tuple[tuple, asyncio.Task]] = {}
+
+def _bot_spec_key(state: GameState) -> tuple:
+    return (state.turn_id, state.state_version, state.bot_persona)
+
+def speculate_bot(state: GameState, last_human_mapped: str):
+    """Startuje w tle AI_BOT_URL + Supervisor dla bieżącej tury – zanim człowiek w ogóle zagra."""
+    # Story Mode nie używa bota
+    if not (BOT_SPECULATE and state.single_player and state.bot_name) or STORY_MODE:
         return
-    print(f"[GameServer] maybe_bot_reply: bot thinking for {BOT_THINK_MS}ms...")
-    if BOT_THINK_MS > 0: await asyncio.sleep(BOT_THINK_MS/1000.0)
+    old = _bot_speculation.pop(state.session_id, None)
+    if old:
+        old[1].cancel()
+    task = _spawn(_bot_decide(state.bot_name, state.bot_persona or BOT_PERSONA, state.to_json_bytes(), last_human_mapped))
+    _bot_speculation[state.session_id] = (_bot_spec_key(state), task)
+
+async def _bot_decide(bot_name: str, persona: str, game_state: bytes, last_human_mapped: str) -> str:
     text_suggestion = None
     try:
-        print(f"[GameServer] maybe_bot_reply: calling AI_BOT_URL")
-        async with httpx.AsyncClient(timeout=10) as client:
-            text_suggestion = (await client.post(AI_BOT_URL, json={
-                "game_state": state.to_json(), "last_human_action": last_human_mapped,
-                "persona": state.bot_persona or BOT_PERSONA, "lang": "pl"
-            })).json().get("text")
-        print(f"[GameServer] maybe_bot_reply: bot suggested: {text_suggestion}")
+        text_suggestion = (await downstream.post_state("ai", AI_BOT_URL, "game_state", game_state, {
+            "last_human_action": last_human_mapped,
+            "persona": persona, "lang": "pl"
+        }, timeout=10)).json().get("text")
+        log.debug("Bot suggested: %s", text_suggestion)
     except Exception as e:
-        print(f"[GameServer] maybe_bot_reply: AI_BOT_URL failed: {e}")
+        log.warning("AI_BOT_URL failed: %s", e)
         text_suggestion = None
     mapped = "wait"
     try:
-        print(f"[GameServer] maybe_bot_reply: validating bot action with supervisor")
-        async with httpx.AsyncClient(timeout=10) as client:
-            val = (await client.post(SUPERVISOR_URL, json={"player": state.bot_name, "input": text_suggestion or "Raportuję do komendanta"})).json()
-            if val.get("valid"): mapped = val.get("mapped_action") or "wait"
-        print(f"[GameServer] maybe_bot_reply: supervisor mapped to: {mapped}")
+        val = (await downstream.post("supervisor", SUPERVISOR_URL, timeout=10, json={"player": bot_name, "input": text_suggestion or "Raportuję do komendanta"})).json()
+        if val.get("valid"): mapped = val.get("mapped_action") or "wait"
+        log.debug("Bot action mapped to: %s", mapped)
     except Exception as e:
-        print(f"[GameServer] maybe_bot_reply: supervisor failed: {e}")
+        log.warning("Supervisor failed for bot action: %s", e)
         mapped = "wait"
-    state.actions[state.bot_name] = mapped
-    print(f"[GameServer] maybe_bot_reply: actions={state.actions}, players={list(state.players.keys())}")
+    return mapped
+
+async def maybe_bot_reply(state: GameState, last_human_mapped: str):
+    if not state.single_player or not state.bot_name: 
+        return
+    if state.bot_name in state.actions: 
+        return
+    mapped = None
+    spec = _bot_speculation.pop(state.session_id, None)
+    if spec and spec[0] == _bot_spec_key(state):
+        # zwykle już gotowe; jeśli nie – i tak wystartowało wcześniej niż ścieżka na żywo
+        try:
+            mapped = await spec[1]
+        except asyncio.CancelledError:
+            mapped = None
+    elif spec:
+        spec[1].cancel()   # stan zmienił się od spekulacji
+    if mapped is None:
+        if BOT_THINK_MS > 0: await asyncio.sleep(BOT_THINK_MS/1000.0)
+        mapped = await _bot_decide(state.bot_name, state.bot_persona or BOT_PERSONA, state.to_json_bytes(), last_human_mapped)
+    await record_action(state, state.bot_name, mapped)
     if len(state.actions) == len(state.players):
-        print(f"[GameServer] maybe_bot_reply: calling process_turn")
         await process_turn(state)
-    else:
-        print(f"[GameServer] maybe_bot_reply: not complete yet, waiting")
 
-async def process_turn_locked(state: GameState):
+# tury, których narracja jest właśnie generowana (session_id, turn_id) -> zdarzenie commitu;
+# drugi wyzwalacz nie generuje jej ponownie, a akcje na kolejną turę czekają na commit
+_closing_turns: dict[tuple[str, int], asyncio.Event] = {}
+
+async def process_turn(state: GameState, expected_turn: int | None = None):
     """
-    Wykonuje zamknięcie tury. Zakłada, że lock dla tej sesji JEST już trzymany.
-    Nie próbuje łapać locka ponownie.
+    Zamknięcie tury w trzech krokach: pod lockiem zdjęcie akcji, bez locka
+    generowanie (orchestrator/scenariusz + TTS), znów pod lockiem commit –
+    tylko jeśli tura to nadal turn_id ze zdjęcia. Lock nie obejmuje I/O.
     """
-    print(f"[GameServer] process_turn_locked called for session {state.session_id}: turn {state.turn_id}, players {len(state.players)}, actions {len(state.actions)}")
-    
-    # jeśli nadal brak kompletu akcji, nic nie rób
-    if len(state.players) >= 2 and len(state.actions) != len(state.players):
-        print(f"[GameServer] process_turn_locked: not complete yet, returning")
-        return
+    with span("turn"):
+        await _close_turn(state, expected_turn)
+
+async def _close_turn(state: GameState, expected_turn: int | None):
+    sid = state.session_id
+    async with get_lock(sid):
+        await store.refresh(state)
+        turn_id = state.turn_id
+        if expected_turn is not None and turn_id != expected_turn:
+            return
+        # jeśli nadal brak kompletu akcji, nic nie rób
+        if len(state.players) >= 2 and len(state.actions) != len(state.players):
+            return
+        if (sid, turn_id) in _closing_turns:
+            return
+        actions = dict(state.actions)
+        game_state = state.to_json_bytes()
+        scenario = scenario_registry.get(state.scenario)
+
+    committed = _closing_turns[(sid, turn_id)] = asyncio.Event()
+    try:
+        log.debug("Closing turn %s: actions %d", turn_id, len(actions))
+        text, image_url, music_url, audio_url = await _generate_turn(sid, turn_id, actions, game_state, scenario)
+        async with get_lock(sid):
+            await store.refresh(state)
+            if state.turn_id != turn_id:
+                log.info("Turn %s already closed – discarding generated narration", turn_id)
+                return
+            payload = {
+                "type": "narrative_update",
+                "session_id": sid,
+                "turn_id": turn_id,
+                "text": text,
+                "image": image_url,
+                "voice_audio": audio_url,
+                "music": music_url
+            }
+            await broadcast(state, telemetry.attach_debug(payload))
+            # zamknij timer i przejdź do następnej tury
+            cancel_timer(state)
+            state.apply_narration(text)
+            state.next_turn()
+            await store.save(state)
+            if state.single_player:
+                human = next((p for p in actions if p != state.bot_name), None)
+                speculate_bot(state, actions.get(human, ""))
+    finally:
+        del _closing_turns[(sid, turn_id)]
+        committed.set()
+
+    # Log do Admin (kolejka w tle)
+    log_shipper.enqueue({
+        "session_id": sid,
+        "turn": turn_id,
+        "actions": actions,
+        "text": text,
+        "image": image_url,
+        "audio": audio_url
+    })
 
+async def _generate_turn(sid: str, turn_id: int, actions: dict, game_state: bytes, scenario) -> tuple:
+    """Narracja, obraz, muzyka i głos tury – wyłącznie ze zdjęcia stanu, bez dostępu do GameState."""
     text = "..."
     image_url = None
     music_url = None
+    audio_url = None
 
-    if SCENARIO == "case_zero" and case_zero_data:
-        turn_data = next((t for t in case_zero_data.get("turns", []) if t.get("turn_id") == state.turn_id), None)
+    if scenario:
+        turn_data = scenario.turn(turn_id)
         if turn_data:
             text = turn_data.get("narration","...")
             image_url = turn_data.get("image")
-            if image_url and image_url.startswith("/assets/"):
-                image_url = f"{PUBLIC_VISION_BASE}{image_url}"
+            audio_url = scenario.voice.get(turn_id)   # z pre-warmu
         else:
-            text = f"Tura {state.turn_id}. Brak danych scenariusza."
+            text = f"Tura {turn_id}. Brak danych scenariusza."
     else:
         try:
-            async with httpx.AsyncClient(timeout=15) as client:
-                res = (await client.post(AI_URL, json={"game_state": state.to_json(), "actions": state.actions})).json()
+            with span("orchestrate"):
+                res = (await downstream.post_state("ai", AI_URL, "game_state", game_state, {"actions": actions}, timeout=15)).json()
             text = res.get("narration","...")
             image_url = res.get("image")
             music_url = res.get("music")
         except Exception:
-            text = f"Tura {state.turn_id}. Deszcz wciąż pada nad miastem."
-
-    # TTS
-    audio_url = None
-    try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            tts = await client.post(TTS_URL, json={"text": text, "turn_id": state.turn_id, "session_id": state.session_id})
-            audio_url = tts.json().get("audio_url")
-    except Exception:
-        audio_url = None
-
-    # Log do Admin
-    headers = {"X-Admin-Token": ADMIN_TOKEN} if ADMIN_TOKEN else {}
-    try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            await client.post(ADMIN_URL, headers=headers, json={
-                "session_id": state.session_id,
-                "turn": state.turn_id,
-                "actions": state.actions,
-                "text": text,
-                "image": image_url,
-                "audio": audio_url
-            })
-    except Exception:
-        pass
-
-    payload = {
-        "type": "narrative_update",
-        "session_id": state.session_id,
-        "turn_id": state.turn_id,
-        "text": text,
-        "image": image_url,
-        "voice_audio": audio_url,
-        "music": music_url
-    }
-    await broadcast(state, payload)
-
-    # zamknij timer i przejdź do następnej tury
-    cancel_timer(state.session_id)
-    state.apply_narration(text)
-    state.next_turn()
+            text = f"Tura {turn_id}. Deszcz wciąż pada nad miastem."
 
+    # TTS (chyba że głos tury scenariusza jest już gotowy)
+    if audio_url is None:
+        try:
+            audio_url = await _tts(sid, turn_id, text)
+        except Exception:
+            audio_url = None
+    return text, image_url, music_url, audio_url
 
-async def process_turn(state: GameState):
-    """
-    Wrapper: łapie lock i woła process_turn_locked.
-    Używaj tej funkcji wszędzie poza timeout taskiem (który sam trzyma lock).
-    """
-    print(f"[GameServer] process_turn wrapper called for session {state.session_id}")
-    lock = get_lock(state.session_id)
-    async with lock:
-        await process_turn_locked(state)
+async def _tts(session_id: str, turn_id: int, text: str, guard: str | None = None) -> str | None:
+    # ten sam tekst => ten sam plik w TTS; równoległe żądania (wiele sesji, pre-warm) idą raz
+    with span("tts"):
+        tts = await downstream.post("tts", TTS_URL, dedupe=text_key(text), guard=guard,
+                                    json={"text": text, "turn_id": turn_id, "session_id": session_id})
+    return tts.json().get("audio_url")
 
 @app.websocket("/ws")
 async def ws_endpoint(ws: WebSocket):
@@ -422,125 +718,272 @@ async def ws_endpoint(ws: WebSocket):
     # oczekuj loginu
     try:
         login = json.loads(await ws.receive_text())
-        print(f"[GameServer] Received login: {login}")
+        log.debug("Received login: %s", login)
     except Exception:
         await ws.send_text(json.dumps({"type":"error","reason":"invalid_login"}))
         await ws.close()
         return
 
     if login.get("type") != "login":
-        print(f"[GameServer] Expected login, got: {login.get('type')}")
+        log.info("Expected login, got: %s", login.get("type"))
         await ws.send_text(json.dumps({"type":"error","reason":"expected_login"}))
         await ws.close()
         return
 
     player = login.get("player")
     session_id = login.get("session_id", "default")
+    logs.bind(session_id, player)
+    if login.get("role") == "spectator":
+        await _spectate(ws, session_id, login)
+        return
     if not player:
         await ws.send_text(json.dumps({"type":"error","reason":"missing_player"}))
         await ws.close()
         return
+    requested = login.get("scenario")
+    if requested and requested != "ai" and not scenario_registry.get(requested):
+        await ws.send_text(json.dumps({"type":"error","reason":"unknown_scenario"}))
+        await ws.close()
+        return
 
-    # init session
-    if session_id not in sessions:
-        sessions[session_id] = GameState(session_id)
-    state = sessions[session_id]
-
-    single_flag = login.get("single_player", None)
-    if single_flag is None: single_flag = SINGLE_PLAYER_DEFAULT
-    state.single_player = bool(single_flag)
-    print(f"[GameServer] Login: player={player}, session_id={session_id}, single_player={state.single_player}")
-    state.bot_persona = login.get("bot_style") or state.bot_persona or BOT_PERSONA
-
-    # rejoin -> podmień gniazdo
-    if player in state.players:
-        state.replace_player_ws(player, ws)
-    else:
-        state.add_player(player, ws)
-    if state.single_player: ensure_bot_present(state)
-
-    await ws.send_text(json.dumps({"type":"info","message":f"joined session {session_id}, turn {state.turn_id}"}))
+    conn = ClientConn(ws, player, negotiate(login.get("encoding")),
+                      delta=_login_flag(login, "delta", STATE_DELTA_DEFAULT),
+                      progressive=_login_flag(login, "progressive", STORY_PROGRESSIVE_DEFAULT))
+    # broadcasty od podpięcia gracza czekają, aż pójdą info i zaległe ramki (_send_joined)
+    conn.hold()
+    # init session (zrzuconą na dysk load() odtwarza)
+    while True:
+        state = await store.load(session_id)
+        async with get_lock(session_id):
+            if sessions.get(session_id) is not state:
+                continue  # sesję właśnie zrzucono z pamięci – wczytaj ponownie
+            await store.refresh(state)
+            _login_into_session(state, player, conn, login)
+            await _send_joined(state, conn, login.get("last_seq"))
+            await store.save(state)
+        break
+    # uzupełnij głos tur, którego nie udało się przygotować wcześniej (np. TTS był niedostępny)
+    prewarmer.schedule(scenario_registry.get(state.scenario))
+    if state.single_player and not state.actions and state.session_id not in _bot_speculation:
+        speculate_bot(state, "")
 
     try:
         while True:
             raw = await ws.receive_text()
-            print(f"[GameServer] Received message from {player}: {raw}")
+            log.debug("Received message: %s", raw, extra={"sampled": True})
             try:
                 msg = json.loads(raw)
             except Exception as e:
-                print(f"[GameServer] JSON parse error: {e}")
-                await ws.send_text(json.dumps({"type":"error","reason":"invalid_payload"}))
+                log.info("JSON parse error: %s", e)
+                conn.send_json({"type":"error","reason":"invalid_payload"})
                 continue
 
-            print(f"[GameServer] Parsed message: {msg}")
-            if msg.get("type") != "action":
-                print(f"[GameServer] Ignoring non-action message: {msg.get('type')}")
+            kind = msg.get("type")
+            if kind == "ack":
+                # klient potwierdza zastosowanie stanu do wersji state_version
+                try:
+                    v = min(int(msg.get("state_version", 0)), state.state_version)
+                except (TypeError, ValueError):
+                    continue
+                conn.acked = max(conn.acked, v)
+                state.acked_versions[player] = max(state.acked_versions.get(player, 0), v)
+                continue
+            if kind == "ping":
+                conn.send_json({"type":"pong","t": msg.get("t")})
+                continue
+            if kind in ("link", "accuse"):
+                # operacje na grafie nie czekają w kolejce za krokiem fabuły
+                if STORY_MODE and state.single_player:
+                    _spawn(_graph_op(state, conn, msg))
+                continue
+            if kind != "action":
+                log.debug("Ignoring non-action message: %s", kind)
+                continue
+
+            # nadmiarowa akcja nie idzie do Supervisora – odrzucona albo odłożona do wolnego tokenu
+            delay = action_limiter.acquire(player, RATE_LIMIT_MAX_WAIT if RATE_LIMIT_MODE == "queue" else 0.0)
+            if delay is None:
+                conn.send_json({"type":"rate_limited","retry_after": round(action_limiter.retry_after(player), 2)})
                 continue
 
-            text_raw = msg.get("text_raw", "")
+            story = STORY_MODE and state.single_player
+            job = Job(player, lambda msg=msg: handle_action(state, player, conn, msg), supersedable=story,
+                      on_superseded=lambda: conn.send_json({"type":"info","message":"Poprzednia akcja zastąpiona nowszą."}))
+            if delay:
+                asyncio.get_running_loop().call_later(delay, _submit_action, state, conn, job, story and STORY_SUPERSEDE)
+            else:
+                _submit_action(state, conn, job, story and STORY_SUPERSEDE)
 
-            # walidacja u Supervisora
+    except WebSocketDisconnect:
+        # rejoin możliwy (gracz zostaje w sesji do pierwszej nieudanej wysyłki)
+        return
+    finally:
+        conn.close()
+
+async def _spectate(ws: WebSocket, session_id: str, login: dict):
+    """Widz: tylko odbiera broadcasty sesji (kanał spectators), akcji nie przyjmujemy."""
+    state = await store.load(session_id, create=False)
+    if state is None:
+        await ws.send_text(json.dumps({"type":"error","reason":"unknown_session"}))
+        await ws.close()
+        return
+    if not spectators.admit(session_id):
+        await ws.send_text(json.dumps({"type":"error","reason":"spectators_full"}))
+        await ws.close()
+        return
+    conn = ClientConn(ws, login.get("player") or "spectator", negotiate(login.get("encoding")),
+                      max_queue=SPECTATOR_OUTBOX_MAX, drop_oldest=True,
+                      delta=_login_flag(login, "delta", STATE_DELTA_DEFAULT),
+                      progressive=_login_flag(login, "progressive", STORY_PROGRESSIVE_DEFAULT))
+    conn.hold()
+    spectators.join(session_id, conn)
+    await _send_joined(state, conn, login.get("last_seq"), role="spectator")
+    try:
+        while True:
             try:
-                async with httpx.AsyncClient(timeout=15) as client:
-                    vr = await client.post(SUPERVISOR_URL, json={"player": player, "input": text_raw})
-                    val = vr.json()
-            except Exception:
-                await ws.send_text(json.dumps({"type":"error","reason":"supervisor_unavailable"}))
+                msg = json.loads(await ws.receive_text())
+            except ValueError:
                 continue
+            kind = msg.get("type") if isinstance(msg, dict) else None
+            if kind == "ping":
+                conn.send_json({"type":"pong","t": msg.get("t")})
+            elif kind == "ack":
+                # wersja widza żyje tylko w połączeniu (baza delt tej repliki: spectators.acked)
+                try:
+                    conn.acked = max(conn.acked, min(int(msg.get("state_version", 0)), state.state_version))
+                except (TypeError, ValueError):
+                    pass
+            elif kind in ("action", "link", "accuse"):
+                conn.send_json({"type":"error","reason":"read_only"})
+    except WebSocketDisconnect:
+        return
+    finally:
+        spectators.leave(session_id, conn)
+        conn.close()
 
-            # Obsługa link i accuse w Story Mode
-            if msg.get("type") == "link" and STORY_MODE and state.single_player:
-                from_label = msg.get("from"); to_label = msg.get("to"); relation = msg.get("relation","implies")
-                async with httpx.AsyncClient(timeout=15) as client:
-                    lr = await client.post("http://ai_orchestrator:8003/link", json={
-                        "state": state.to_json(),
-                        "from_label": from_label, "to_label": to_label, "relation": relation
-                    })
-                    delta = lr.json()
-                # scal do grafu i wyślij graph_update
-                state._cg_merge(delta)
-                payload = {"type":"graph_update","session_id": state.session_id,"turn_id": state.turn_id,"graph_delta": delta,"case_graph": state.case_graph}
-                await broadcast(state, payload)
-                continue
+def _submit_action(state: GameState, conn: ClientConn, job: Job, supersede: bool):
+    if not work_queues.submit(state.session_id, job, supersede=supersede):
+        conn.send_json({"type":"error","reason":"busy"})
 
-            if msg.get("type") == "accuse" and STORY_MODE and state.single_player:
-                suspect_label = msg.get("suspect")
-                async with httpx.AsyncClient(timeout=30) as client:
-                    ar = await client.post("http://ai_orchestrator:8003/accuse", json={"state": state.to_json(),"suspect_label": suspect_label})
-                    result = ar.json()
-                # verdict_update (epilog)
-                payload = {"type":"verdict_update","session_id": state.session_id,"turn_id": state.turn_id,
-                           "verdict": result.get("verdict"), "epilogue": result.get("epilogue"), "sfx": result.get("sfx_urls", [])}
-                await broadcast(state, payload)
-                continue
+async def handle_action(state: GameState, player: str, conn: ClientConn, msg: dict):
+    text_raw = msg.get("text_raw", "")
+    # każda akcja to własne zadanie kolejki sesji – trace obejmuje jej etapy aż po broadcast tury
+    telemetry.start_trace()
 
-            # W Story Mode Single Player - zawsze wywołuj process_story_step (reframe w Orchestrator)
-            if STORY_MODE and state.single_player:
-                print(f"[GameServer] Calling process_story_step: STORY_MODE={STORY_MODE}, single_player={state.single_player}")
-                # użyj oryginalnego text_raw użytkownika jako wejście do sceny
-                await process_story_step(state, text_raw, val)  # gdzie val to wynik SUPERVISOR /validate
-                continue
+    # walidacja u Supervisora
+    try:
+        with span("supervisor"):
+            vr = await downstream.post("supervisor", SUPERVISOR_URL, json={"player": player, "input": text_raw})
+        if vr.status_code == 429:
+            # limit Supervisora mimo lokalnego bucketu (np. akcja długo czekała w kolejce sesji)
+            conn.send_json({"type":"rate_limited","retry_after": action_limiter.seconds})
+            return
+        val = vr.json()
+    except Exception:
+        conn.send_json({"type":"error","reason":"supervisor_unavailable"})
+        return
 
-            if not val.get("valid"):
-                await ws.send_text(json.dumps({"type":"error","reason":val.get("reason","invalid_action")}))
-                continue
+    # W Story Mode Single Player - zawsze wywołuj process_story_step (reframe w Orchestrator)
+    if STORY_MODE and state.single_player:
+        # użyj oryginalnego text_raw użytkownika jako wejście do sceny
+        if not await process_story_step(state, text_raw, val):  # gdzie val to wynik SUPERVISOR /validate
+            conn.send_json({"type":"error","reason":"story_unavailable"})
+        return
 
-            mapped = val.get("mapped_action") or "wait"
-            state.actions[player] = mapped
+    if not val.get("valid"):
+        conn.send_json({"type":"error","reason":val.get("reason","invalid_action")})
+        return
 
-            if not state.single_player:
-                if len(state.players) < 2:
-                    await ws.send_text(json.dumps({"type":"info","message":"Akcja przyjęta (oczekuje na partnera)."}))
-                    continue
-                if len(state.actions) < len(state.players):
-                    ensure_timer(state)
-                    await ws.send_text(json.dumps({"type":"info","message":"Akcja przyjęta. Czekamy na drugiego gracza."}))
-                    continue
-                await process_turn(state); continue
+    mapped = val.get("mapped_action") or "wait"
+    await record_action(state, player, mapped)
+
+    if not state.single_player:
+        if len(state.players) < 2:
+            conn.send_json({"type":"info","message":"Akcja przyjęta (oczekuje na partnera)."})
+            return
+        if len(state.actions) < len(state.players):
+            ensure_timer(state)
+            conn.send_json({"type":"info","message":"Akcja przyjęta. Czekamy na drugiego gracza."})
+            return
+        await process_turn(state)
+        return
 
-            # single player: bot domyka turę
-            await maybe_bot_reply(state, mapped)
+    # single player: bot domyka turę
+    await maybe_bot_reply(state, mapped)
 
-    except WebSocketDisconnect:
-        # rejoin możliwy
-        return
\ No newline at end of file
+async def _graph_op(state: GameState, conn: ClientConn, msg: dict):
+    """Obsługa link i accuse w Story Mode – równolegle z kolejką akcji sesji."""
+    kind = msg.get("type")
+    try:
+        if kind == "link":
+            lr = await downstream.post_state("ai", "http://ai_orchestrator:8003/link", "state", state.to_json_bytes(), {
+                "from_label": msg.get("from"), "to_label": msg.get("to"), "relation": msg.get("relation","implies")
+            }, timeout=15)
+            delta = lr.json()
+            # scal do grafu i wyślij graph_update
+            async with get_lock(state.session_id):
+                await store.refresh(state)
+                state._cg_merge(delta)
+                await store.save(state)
+                # widok stanu z chwili scalenia – broadcast jeszcze pod lockiem
+                await broadcast(state, {"type":"graph_update","session_id": state.session_id,"turn_id": state.turn_id,
+                                        "graph_delta": delta,
+                                        VIEW: world_view(state, ("case_graph",), spectators.acked(state.session_id))})
+        else:
+            ar = await downstream.post_state("ai", "http://ai_orchestrator:8003/accuse", "state", state.to_json_bytes(),
+                                             {"suspect_label": msg.get("suspect")})
+            result = ar.json()
+            # verdict_update (epilog)
+            payload = {"type":"verdict_update","session_id": state.session_id,"turn_id": state.turn_id,
+                       "verdict": result.get("verdict"), "epilogue": result.get("epilogue"), "sfx": result.get("sfx_urls", [])}
+            await broadcast(state, payload)
+    except Exception as e:
+        log.warning("%s failed: %s", kind, e)
+        conn.send_json({"type":"error","reason":f"{kind}_failed"})
+
+async def _send_joined(state: GameState, conn: ClientConn, last_seq, role: str = "player"):
+    """info po loginie i ramki nowsze niż last_seq; potem wstrzymane (conn.hold()) broadcasty bez duplikatów."""
+    try:
+        since = int(last_seq) if last_seq is not None else None
+    except (TypeError, ValueError):
+        since = -1
+    head, missed = await store.frames_since(state, since if since is not None else 0)
+    info = {"type":"info","message":f"joined session {state.session_id}, turn {state.turn_id}",
+            "role": role, "encoding": conn.encoding, "seq": head}
+    if since is not None:
+        # None: ramki wypadły z bufora – klient musi odświeżyć stan sam (replay "expired")
+        info["replay"] = "expired" if missed is None else len(missed)
+    missed = (missed or []) if since is not None else []
+    first = [Frame(info)]
+    if conn.delta:
+        # login/rejoin: pełny snapshot, dalej już tylko delty względem potwierdzonej wersji
+        conn.acked = state.state_version
+        first.append(Frame(_state_snapshot(state)))
+    for _, text in missed:
+        frame = FrameViews(Frame(json.loads(text), text)).for_conn(conn)
+        if frame is not None:
+            first.append(frame)
+    conn.release(first, {seq for seq, _ in missed})
+
+def _login_flag(login: dict, name: str, default: bool) -> bool:
+    flag = login.get(name, None)
+    return default if flag is None else bool(flag)
+
+def _login_into_session(state: GameState, player: str, conn: ClientConn, login: dict):
+    session_id = state.session_id
+    single_flag = login.get("single_player", None)
+    if single_flag is None: single_flag = SINGLE_PLAYER_DEFAULT
+    state.single_player = bool(single_flag)
+    state.bot_persona = login.get("bot_style") or state.bot_persona or BOT_PERSONA
+    state.scenario = login.get("scenario") or state.scenario or SCENARIO
+    log.info("Login: single_player=%s, scenario=%s", state.single_player, state.scenario)
+    if conn.delta:
+        # wersja ze snapshotu loginu – wspólna baza delt w ramkach bazowych (views.world_view)
+        state.acked_versions[player] = state.state_version
+
+    # rejoin -> podmień połączenie (stare, jeśli jeszcze żyje, zamknij)
+    old = state.players.get(player)
+    if old is not None and old is not conn:
+        old.close()
+    state.add_player(player, conn)
+    if state.single_player: ensure_bot_present(state)
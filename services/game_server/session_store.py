@@ -0,0 +1,304 @@
+"""
+Magazyn sesji Game Servera.
+
+MemorySessionStore (domyślny) – sesje żyją w pamięci jednego procesu.
+RedisSessionStore (SESSION_STORE=redis) – stan GameState w Redis, rozproszone
+locki per sesja oraz broadcasty rozsyłane przez Redis pub/sub do repliki,
+która trzyma gniazdo danego gracza. Pozwala uruchomić kilka replik game_server
+za Traefikiem.
+
+Sesje bez aktywności dłużej niż SESSION_IDLE_SECONDS są zdejmowane z pamięci
+(evict): magazyn pamięciowy zrzuca je do SESSION_SPILL_DIR (msgpack, bez niego
+JSON), redisowy tylko porzuca lokalną kopię. load() odtwarza je przy ponownym
+wejściu gracza.
+"""
+import os, json, time, uuid, asyncio, logging
+from contextlib import asynccontextmanager
+from urllib.parse import quote
+from game_state import GameState, WS_REPLAY_MAX
+
+log = logging.getLogger("game_server.session_store")
+
+try:
+    import msgpack
+except Exception:
+    msgpack = None
+
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "86400"))
+SESSION_LOCK_TIMEOUT = float(os.getenv("SESSION_LOCK_TIMEOUT", "60"))
+REPLICA_ID = os.getenv("REPLICA_ID") or uuid.uuid4().hex[:12]
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "900"))
+SESSION_SPILL_DIR = os.getenv("SESSION_SPILL_DIR", "data/sessions")
+
+_KEY = "gs:session:"
+_LOCK = "gs:lock:"
+_CHANNEL = "gs:bcast:"
+_SEQ = "gs:seq:"
+_REPLAY = "gs:replay:"
+
+
+class MemorySessionStore:
+    name = "memory"
+    distributed = False
+
+    def __init__(self):
+        self.sessions: dict[str, GameState] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._last_active: dict[str, float] = {}
+        self.evicted = 0
+
+    async def start(self, deliver):
+        pass
+
+    async def close(self):
+        pass
+
+    async def load(self, session_id: str, create: bool = True) -> GameState | None:
+        state = self.sessions.get(session_id)
+        if state is None:
+            data = await asyncio.to_thread(_read_spill, session_id)
+            if session_id in self.sessions:
+                # ktoś wczytał sesję w trakcie odczytu z dysku
+                return await self.load(session_id, create)
+            if data is not None:
+                state = GameState.from_snapshot(data)
+            elif create:
+                state = GameState(session_id)
+            else:
+                return None
+            self.sessions[session_id] = state
+        self.touch(session_id)
+        return state
+
+    async def refresh(self, state: GameState):
+        pass
+
+    async def save(self, state: GameState):
+        self.touch(state.session_id)
+
+    def touch(self, session_id: str):
+        self._last_active[session_id] = time.monotonic()
+
+    def idle_sessions(self) -> list[str]:
+        cutoff = time.monotonic() - SESSION_IDLE_SECONDS
+        return [sid for sid in self.sessions if self._last_active.get(sid, 0) < cutoff]
+
+    async def evict(self, state: GameState):
+        """Zrzuca sesję na dysk i zwalnia ją z pamięci (wołać pod lockiem sesji)."""
+        await asyncio.to_thread(_write_spill, state.session_id, _compact(state))
+        self.forget(state.session_id)
+
+    def forget(self, session_id: str):
+        self.sessions.pop(session_id, None)
+        self._locks.pop(session_id, None)
+        self._last_active.pop(session_id, None)
+        self.evicted += 1
+
+    def lock(self, session_id: str):
+        if session_id not in self._locks:
+            self._locks[session_id] = asyncio.Lock()
+        return self._locks[session_id]
+
+    async def publish(self, session_id: str, data: str):
+        # jedna replika – nie ma komu przekazywać
+        pass
+
+    async def next_seq(self, state: GameState) -> int:
+        """Kolejny numer ramki broadcastu sesji."""
+        return state.next_frame_seq()
+
+    async def remember_frame(self, state: GameState, seq: int, text: str):
+        state.remember_frame(seq, text)
+
+    async def frames_since(self, state: GameState, seq: int) -> tuple[int, list[tuple[int, str]] | None]:
+        """(bieżący numer, ramki nowsze niż seq albo None, gdy bufor ich już nie obejmuje)."""
+        return state.frame_seq, state.frames_since(seq)
+
+
+class RedisSessionStore(MemorySessionStore):
+    name = "redis"
+    distributed = True
+
+    def __init__(self, url: str = REDIS_URL):
+        import redis.asyncio as aioredis
+        super().__init__()
+        self.redis = aioredis.Redis.from_url(url, decode_responses=True)
+        self._listener: asyncio.Task | None = None
+
+    async def start(self, deliver):
+        """deliver(session_id, data) – dostarcza ramkę z innej repliki do lokalnych gniazd."""
+        self._listener = asyncio.create_task(self._listen(deliver))
+
+    async def close(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+        await self.redis.aclose()
+
+    async def load(self, session_id: str, create: bool = True) -> GameState | None:
+        state = self.sessions.get(session_id)
+        if state is not None:
+            await self.refresh(state)
+            return state
+        raw = await self.redis.get(_KEY + session_id)
+        if raw:
+            state = GameState.from_snapshot(json.loads(raw))
+        elif create:
+            state = GameState(session_id)
+            await self.save(state)
+        else:
+            return None
+        # lokalna kopia trzyma gniazda graczy podłączonych do tej repliki
+        self.sessions[session_id] = state
+        self.touch(session_id)
+        return state
+
+    async def refresh(self, state: GameState):
+        raw = await self.redis.get(_KEY + state.session_id)
+        if raw:
+            state.load_snapshot(json.loads(raw))
+
+    async def save(self, state: GameState):
+        await self.redis.set(_KEY + state.session_id, json.dumps(state.to_snapshot(), ensure_ascii=False),
+                             ex=SESSION_TTL_SECONDS)
+        self.touch(state.session_id)
+
+    async def evict(self, state: GameState):
+        # stan i tak jest w Redis (z TTL) – wystarczy porzucić lokalną kopię
+        self.forget(state.session_id)
+
+    def lock(self, session_id: str):
+        # lokalny lock ogranicza wyścig w procesie, redisowy – między replikami
+        local = super().lock(session_id)
+
+        @asynccontextmanager
+        async def _locked():
+            async with local:
+                lock = self.redis.lock(_LOCK + session_id, timeout=SESSION_LOCK_TIMEOUT,
+                                       blocking_timeout=SESSION_LOCK_TIMEOUT, thread_local=False)
+                if not await lock.acquire():
+                    raise TimeoutError(f"session lock {session_id} not acquired")
+                try:
+                    yield
+                finally:
+                    try:
+                        await lock.release()
+                    except Exception:
+                        pass  # lock wygasł (timeout) – nie ma czego zwalniać
+        return _locked()
+
+    async def publish(self, session_id: str, data: str):
+        await self.redis.publish(_CHANNEL + session_id, f"{REPLICA_ID}|{data}")
+
+    async def next_seq(self, state: GameState) -> int:
+        # licznik w Redis – wspólny dla replik, INCR jest atomowy (bez locka sesji, którego
+        # broadcast i tak często już trzyma)
+        seq = await self.redis.incr(_SEQ + state.session_id)
+        state.frame_seq = max(state.frame_seq, seq)
+        return seq
+
+    async def remember_frame(self, state: GameState, seq: int, text: str):
+        key = _REPLAY + state.session_id
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, f"{seq}|{text}")
+            pipe.ltrim(key, -WS_REPLAY_MAX, -1)
+            pipe.expire(key, SESSION_TTL_SECONDS)
+            pipe.expire(_SEQ + state.session_id, SESSION_TTL_SECONDS)
+            await pipe.execute()
+
+    async def frames_since(self, state: GameState, seq: int) -> tuple[int, list[tuple[int, str]] | None]:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.get(_SEQ + state.session_id)
+            pipe.lrange(_REPLAY + state.session_id, 0, -1)
+            head, raw = await pipe.execute()
+        head = int(head or 0)
+        # repliki dopisują ramki współbieżnie – kolejność w liście nie musi być rosnąca
+        frames = sorted((int(n), text) for n, _, text in (r.partition("|") for r in raw))
+        floor = frames[0][0] - 1 if len(frames) >= WS_REPLAY_MAX else (0 if frames or not head else head)
+        if seq < floor or seq > head:
+            return head, None
+        return head, [f for f in frames if f[0] > seq]
+
+    async def _listen(self, deliver):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.psubscribe(_CHANNEL + "*")
+                async for msg in pubsub.listen():
+                    if msg.get("type") != "pmessage":
+                        continue
+                    origin, _, data = msg["data"].partition("|")
+                    if origin == REPLICA_ID:
+                        continue
+                    session_id = msg["channel"][len(_CHANNEL):]
+                    try:
+                        await deliver(session_id, data)
+                    except Exception as e:
+                        log.warning("Redis broadcast delivery error: %s", e, extra={"session_id": session_id})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("Redis pub/sub error: %s – reconnecting", e)
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+
+def _compact(state: GameState) -> dict:
+    # log zmian i potwierdzenia klientów nie przeżyją rozłączenia – po powrocie i tak idzie pełny snapshot
+    data = state.to_snapshot()
+    data["changes"] = []
+    data["changes_floor"] = state.state_version
+    data["acked_versions"] = {}
+    # zrzucana sesja nie ma żywych gniazd – po wczytaniu gracz bez gniazda (None) wyglądałby jak bot
+    # albo gracz innej repliki i nigdy by nie wypadł (liczyłby się do kompletu akcji); wraca loginem
+    data["players"] = [p for p in data["players"] if p == state.bot_name]
+    return data
+
+def _spill_path(session_id: str, ext: str) -> str:
+    return os.path.join(SESSION_SPILL_DIR, quote(session_id, safe="") + ext)
+
+def _write_spill(session_id: str, data: dict):
+    os.makedirs(SESSION_SPILL_DIR, exist_ok=True)
+    if msgpack is not None:
+        path, raw = _spill_path(session_id, ".msgpack"), msgpack.packb(data, use_bin_type=True)
+    else:
+        path, raw = _spill_path(session_id, ".json"), json.dumps(data, ensure_ascii=False).encode("utf-8")
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(raw)
+    os.replace(tmp, path)
+
+def _read_spill(session_id: str) -> dict | None:
+    for ext in (".msgpack", ".json"):
+        path = _spill_path(session_id, ext)
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as f:
+            raw = f.read()
+        if ext == ".msgpack":
+            if msgpack is None:
+                continue
+            data = msgpack.unpackb(raw, raw=False, strict_map_key=False)
+        else:
+            data = json.loads(raw)
+        # od teraz stan żyje w pamięci – plik powstanie od nowa przy następnym evict
+        os.remove(path)
+        return data
+    return None
+
+def make_store() -> MemorySessionStore:
+    if SESSION_STORE == "redis":
+        try:
+            return RedisSessionStore()
+        except Exception as e:
+            log.warning("Redis session store unavailable (%s) – using memory store", e)
+    return MemorySessionStore()
@@ -0,0 +1,42 @@
+"""
+Single-flight: współbieżne identyczne wywołania dzielą jeden wynik.
+
+Pierwsze wywołanie z danym kluczem startuje zadanie, kolejne (dopóki trwa)
+czekają na ten sam wynik albo ten sam wyjątek. Zadanie żyje niezależnie od
+czekających – anulowanie jednego z nich (deadline, supersede) nie przerywa
+wywołania pozostałym. Tylko dla operacji idempotentnych (TTS po tekście,
+dopasowanie obrazu po zapytaniu).
+"""
+import asyncio, hashlib
+from functools import partial
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: dict[object, asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key, fn):
+        """fn() -> korutyna; wynik współdzielony ze wszystkimi czekającymi na ten sam klucz."""
+        task = self._calls.get(key)
+        if task is None:
+            self.calls += 1
+            task = self._calls[key] = asyncio.create_task(fn())
+            task.add_done_callback(partial(self._done, key))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # odebrany – bez ostrzeżenia, gdy nikt już nie czekał
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._calls), "calls": self.calls, "shared": self.shared}
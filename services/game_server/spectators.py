@@ -0,0 +1,61 @@
+"""
+Widzowie sesji (login z "role": "spectator").
+
+Widz nie jest graczem: nie trafia do state.players, nie liczy się do kompletu
+akcji i nie wysyła akcji. Każda sesja ma kanał widzów – broadcast sesji trafia
+do niego tymi samymi ramkami co do graczy (views.FrameViews – kodowanie raz
+na widok i kodek dla wszystkich gniazd), po kolejkach graczy. Backpressure widzów jest inna niż
+graczy: krótka kolejka (SPECTATOR_OUTBOX_MAX) gubi najstarsze ramki zamiast
+zamykać połączenie – widz z luką w seq może wejść ponownie z last_seq.
+Limit widzów na sesję: SPECTATORS_MAX_PER_SESSION (0 = widzowie wyłączeni).
+"""
+import os
+from connections import ClientConn, coalesce_key
+from views import FrameViews
+
+SPECTATORS_MAX_PER_SESSION = int(os.getenv("SPECTATORS_MAX_PER_SESSION", "200"))
+SPECTATOR_OUTBOX_MAX = int(os.getenv("SPECTATOR_OUTBOX_MAX", "16"))
+
+
+class SpectatorHub:
+    def __init__(self, limit: int = SPECTATORS_MAX_PER_SESSION):
+        self.limit = limit
+        self._channels: dict[str, set[ClientConn]] = {}
+        self.rejected = 0
+
+    def admit(self, session_id: str) -> bool:
+        """Czy sesja ma jeszcze miejsce dla widza (odmowa liczona w stats)."""
+        if len(self._channels.get(session_id, ())) >= self.limit:
+            self.rejected += 1
+            return False
+        return True
+
+    def join(self, session_id: str, conn: ClientConn):
+        self._channels.setdefault(session_id, set()).add(conn)
+
+    def leave(self, session_id: str, conn: ClientConn):
+        viewers = self._channels.get(session_id)
+        if viewers is None:
+            return
+        viewers.discard(conn)
+        if not viewers:
+            del self._channels[session_id]
+
+    def publish(self, session_id: str, views: FrameViews):
+        viewers = self._channels.get(session_id)
+        if not viewers:
+            return
+        key = coalesce_key(views.frame.payload)
+        for conn in list(viewers):
+            frame = views.for_conn(conn)
+            if frame is not None and not conn.send(frame, key):
+                self.leave(session_id, conn)
+
+    def acked(self, session_id: str) -> list[int]:
+        """Wersje stanu potwierdzone przez widzów sesji z protokołem delta."""
+        return [c.acked for c in self._channels.get(session_id, ()) if c.delta]
+
+    def stats(self) -> dict:
+        conns = [c for v in self._channels.values() for c in v]
+        return {"limit": self.limit, "sessions": len(self._channels), "viewers": len(conns),
+                "rejected": self.rejected, "dropped": sum(c.dropped for c in conns)}
@@ -0,0 +1,103 @@
+"""
+Pomiary czasu tur Game Servera i eksport w formacie Prometheus.
+
+span("tts") mierzy etap tury: czas trafia do histogramu
+game_server_span_seconds{span="tts"} oraz – jeśli w bieżącym kontekście
+trwa trace tury (start_trace(), contextvars) – do jej sumy per etap.
+TRACE_DEBUG_FIELD=1 dokleja te sumy (ms) do ramki tury jako pole "debug".
+render() buduje tekst /metrics: histogramy plus liczniki i głębokości kolejek
+podane przez wywołującego (zbierane w chwili odczytu z istniejących stats()).
+"""
+import os, time, contextvars
+from contextlib import contextmanager
+
+TRACE_DEBUG_FIELD = os.getenv("TRACE_DEBUG_FIELD", "0") == "1"
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, label: str, buckets: tuple = BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self._series: dict[str, list] = {}   # wartość etykiety -> [liczniki kubełków, suma, liczba]
+
+    def observe(self, label_value: str, value: float):
+        s = self._series.get(label_value)
+        if s is None:
+            s = self._series[label_value] = [[0] * len(self.buckets), 0.0, 0]
+        for i, le in enumerate(self.buckets):
+            if value <= le:
+                s[0][i] += 1
+        s[1] += value
+        s[2] += 1
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for lv, (counts, total, n) in sorted(self._series.items()):
+            lab = f'{self.label}="{lv}"'
+            for le, c in zip(self.buckets, counts):
+                out.append(f'{self.name}_bucket{{{lab},le="{le}"}} {c}')
+            out.append(f'{self.name}_bucket{{{lab},le="+Inf"}} {n}')
+            out.append(f"{self.name}_sum{{{lab}}} {total:.6f}")
+            out.append(f"{self.name}_count{{{lab}}} {n}")
+        return out
+
+
+spans = Histogram("game_server_span_seconds", "Czas etapów tury (supervisor, story, orchestrate, tts, vision, admin_log, broadcast, turn)", "span")
+
+
+class Trace:
+    __slots__ = ("spans",)
+
+    def __init__(self):
+        self.spans: dict[str, float] = {}
+
+    def debug(self) -> dict:
+        return {"spans_ms": {k: round(v * 1000, 1) for k, v in self.spans.items()}}
+
+
+_trace: contextvars.ContextVar[Trace | None] = contextvars.ContextVar("turn_trace", default=None)
+
+
+def start_trace() -> Trace:
+    """Nowy trace dla bieżącego kontekstu (zadania) – etapy mierzone dalej w tym kontekście trafiają do niego."""
+    trace = Trace()
+    _trace.set(trace)
+    return trace
+
+
+def attach_debug(payload: dict) -> dict:
+    trace = _trace.get()
+    if TRACE_DEBUG_FIELD and trace is not None:
+        payload["debug"] = trace.debug()
+    return payload
+
+
+@contextmanager
+def span(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        spans.observe(name, dt)
+        trace = _trace.get()
+        if trace is not None:
+            trace.spans[name] = trace.spans.get(name, 0.0) + dt
+
+
+def render(metrics: dict[str, tuple[str, str, dict | float]]) -> str:
+    """metrics: nazwa -> (typ gauge|counter, opis, wartość albo {(etykieta, wartość etykiety): wartość})."""
+    out = spans.render()
+    for name, (kind, help, value) in metrics.items():
+        out.append(f"# HELP {name} {help}")
+        out.append(f"# TYPE {name} {kind}")
+        if isinstance(value, dict):
+            for (label, lv), v in value.items():
+                out.append(f'{name}{{{label}="{lv}"}} {v}')
+        else:
+            out.append(f"{name} {value}")
+    return "\n".join(out) + "\n"
@@ -0,0 +1,104 @@
+"""
+Haszowane koło czasowe dla deadline'ów tur.
+
+Jedno zadanie w tle obsługuje wszystkie timery zamiast osobnego, śpiącego
+zadania na sesję. Klucz timera to (session_id, turn_id); arm() i cancel()
+są O(1). Koło nie trzyma referencji do GameState – po wygaśnięciu woła
+on_expire(session_id, turn_id), a ten sam wczytuje sesję (także zrzuconą
+z pamięci przez reaper).
+"""
+import os, math, time, asyncio, logging
+
+log = logging.getLogger("game_server.timers")
+
+TURN_TIMER_TICK = float(os.getenv("TURN_TIMER_TICK", "0.5"))
+TURN_TIMER_SLOTS = int(os.getenv("TURN_TIMER_SLOTS", "512"))
+
+
+class TimerWheel:
+    def __init__(self, on_expire, tick: float = TURN_TIMER_TICK, slots: int = TURN_TIMER_SLOTS):
+        self.on_expire = on_expire        # async (session_id, turn_id) -> None
+        self.tick = tick
+        self._slots: list[dict[tuple, int]] = [{} for _ in range(slots)]   # klucz -> pozostałe obroty
+        self._where: dict[tuple, tuple[int, float]] = {}                    # klucz -> (slot, termin)
+        self._cursor = 0
+        self._task: asyncio.Task | None = None
+        self._running: set[asyncio.Task] = set()
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self._where
+
+    def arm(self, session_id: str, turn_id: int, delay: float) -> bool:
+        """Uzbraja timer; False, jeśli timer tej tury już tyka."""
+        key = (session_id, turn_id)
+        if key in self._where:
+            return False
+        ticks = max(1, math.ceil(delay / self.tick))
+        slot = (self._cursor + ticks) % len(self._slots)
+        # obroty liczone od najbliższego odwiedzenia slotu (po ticks % n krokach)
+        self._slots[slot][key] = (ticks - 1) // len(self._slots)
+        self._where[key] = (slot, time.monotonic() + delay)
+        return True
+
+    def cancel(self, session_id: str, turn_id: int) -> bool:
+        entry = self._where.pop((session_id, turn_id), None)
+        if entry is None:
+            return False
+        self._slots[entry[0]].pop((session_id, turn_id), None)
+        return True
+
+    def pending(self) -> list[dict]:
+        now = time.monotonic()
+        return [{"session_id": sid, "turn_id": turn, "due_in": round(max(0.0, due - now), 2)}
+                for (sid, turn), (_, due) in sorted(self._where.items(), key=lambda kv: kv[1][1])]
+
+    def stats(self) -> dict:
+        return {"armed": len(self._where), "running": len(self._running), "expired": self.expired,
+                "tick": self.tick, "slots": len(self._slots)}
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time() + self.tick
+        while True:
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            # nadrabiamy ticki, jeśli pętla zdarzeń się spóźniła
+            while next_tick <= loop.time():
+                self._advance()
+                next_tick += self.tick
+
+    def _advance(self):
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        slot = self._slots[self._cursor]
+        for key, rounds in list(slot.items()):
+            if rounds > 0:
+                slot[key] = rounds - 1
+                continue
+            del slot[key]
+            self._where.pop(key, None)
+            self.expired += 1
+            task = asyncio.create_task(self._fire(*key))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _fire(self, session_id: str, turn_id: int):
+        try:
+            await self.on_expire(session_id, turn_id)
+        except Exception as e:
+            log.exception("Turn timer error: turn %s", turn_id, extra={"session_id": session_id})
@@ -0,0 +1,79 @@
+"""
+Widoki ramek sesji per połączenie.
+
+Tryb stanu negocjuje każde połączenie we własnym loginie ("delta"), więc
+w jednej sesji mogą być klienci z pełnym stanem i z deltami, każdy z inną
+potwierdzoną wersją. Broadcast niesie jedną ramkę bazową: zdarzenie plus
+(pod kluczem "_view") stan świata z chwili zmiany i operacje dziennika od
+najstarszej wersji potwierdzonej przez graczy sesji (wspólne acked_versions,
+więc obejmuje też graczy innych replik) i widzów tej repliki; widz innej
+repliki, który został w tyle, dostaje pełny stan. Taka ramka idzie do bufora
+replay i przez pub/sub; ramkę dla połączenia składa dopiero FrameViews.for_conn() –
+bez stanu sesji, więc działa też na replice, która sesji nie ma w pamięci.
+Połączenia o tym samym widoku dzielą jeden wire.Frame (kodowanie raz).
+Tak samo tryb mediów ("progressive"): ramka z "_audience" idzie tylko do
+połączeń tego trybu; pozostałe zapamiętują jej seq i następna ramka, którą
+dostaną, niesie go w "replaces" – numeracja u klienta zostaje bez luk.
+"""
+from wire import Frame
+
+VIEW = "_view"
+AUDIENCE = "_audience"   # "progressive" | "classic" – tylko połączenia tego trybu mediów
+
+
+def world_view(state, full: tuple[str, ...], viewers: list[int] = ()) -> dict:
+    """Stan świata do ramki bazowej; full – pola ramki dla klientów bez delt,
+    viewers – wersje potwierdzone przez widzów tej repliki (nie ma ich we wspólnym stanie)."""
+    present = [state.acked_versions[name] for name in state.players if name in state.acked_versions]
+    base = min(present + list(viewers), default=state.state_version)
+    delta = state.delta_since(base)
+    return {"world": state.world_snapshot(), "full": list(full), "version": state.state_version,
+            "base": base if delta is not None else None, "ops": delta["ops"] if delta is not None else []}
+
+
+def render(payload: dict, delta: bool, acked: int) -> dict:
+    view = payload.get(VIEW)
+    out = {k: v for k, v in payload.items() if k != VIEW and k != AUDIENCE}
+    if view is None:
+        return out
+    world = view["world"]
+    if not delta:
+        out.update((k, world[k]) for k in view["full"])
+        return out
+    out["state_version"] = view["version"]
+    if view["base"] is None or acked < view["base"]:
+        # dziennik nie sięga wersji klienta – pełny stan zamiast delty
+        out["state"] = world
+    else:
+        out["state_delta"] = {"base": acked, "ops": [op for op in view["ops"] if op["v"] > acked]}
+    return out
+
+
+class FrameViews:
+    """Ramki jednego broadcastu per widok połączenia."""
+    __slots__ = ("frame", "_views")
+
+    def __init__(self, frame: Frame):
+        self.frame = frame
+        self._views: dict[tuple, Frame] = {}
+
+    def for_conn(self, conn) -> Frame | None:
+        """Ramka dla połączenia; None – ramka innego trybu mediów (seq trafi do replaces następnej)."""
+        payload = self.frame.payload
+        audience = payload.get(AUDIENCE)
+        if audience is not None and audience != ("progressive" if conn.progressive else "classic"):
+            if payload.get("seq") is not None:
+                conn.skipped.append(payload["seq"])
+            return None
+        skipped = tuple(conn.skipped)
+        conn.skipped.clear()
+        if VIEW not in payload and audience is None and not skipped:
+            return self.frame
+        key = (conn.delta, conn.acked if conn.delta else None, skipped)
+        frame = self._views.get(key)
+        if frame is None:
+            out = render(payload, conn.delta, conn.acked)
+            if skipped:
+                out["replaces"] = [*skipped, *out.get("replaces", [])]
+            frame = self._views[key] = Frame(out)
+        return frame
@@ -0,0 +1,53 @@
+"""
+Kodowanie ramek WebSocket Game Servera.
+
+Klient wybiera kodowanie polem "encoding" w login: "json" (domyślne, ramki
+tekstowe), "msgpack" (ramki binarne) albo "deflate" (JSON skompresowany
+zlib, ramki binarne). Frame serializuje payload do JSON od razu przy
+tworzeniu – payloady wskazują na żywy stan sesji (metrics, case_graph), a
+writer połączenia koduje ramkę dopiero później. Pozostałe kodowania powstają
+leniwie z tego tekstu, najwyżej raz na kodowanie – broadcast do wielu gniazd
+płaci za każdy kodek jeden raz. payload służy dalej tylko do routingu
+(typ, klucze podmiany).
+Bez msgpack w środowisku sesja dostaje JSON (login zwraca faktyczne kodowanie).
+"""
+import os, json, zlib
+
+try:
+    import msgpack
+except Exception:
+    msgpack = None
+
+WS_DEFLATE_LEVEL = int(os.getenv("WS_DEFLATE_LEVEL", "6"))
+
+ENCODINGS = ("json", "msgpack", "deflate")
+
+
+def negotiate(requested: str | None) -> str:
+    if requested == "msgpack" and msgpack is None:
+        return "json"
+    return requested if requested in ENCODINGS else "json"
+
+
+class Frame:
+    __slots__ = ("payload", "_encoded")
+
+    def __init__(self, payload: dict, text: str | None = None):
+        self.payload = payload
+        self._encoded: dict[str, str | bytes] = {"json": text if text is not None else json.dumps(payload)}
+
+    @property
+    def text(self) -> str:
+        return self.encoded("json")
+
+    def encoded(self, encoding: str) -> str | bytes:
+        data = self._encoded.get(encoding)
+        if data is None:
+            if encoding == "msgpack":
+                data = msgpack.packb(json.loads(self.text), use_bin_type=True)
+            elif encoding == "deflate":
+                data = zlib.compress(self.text.encode("utf-8"), WS_DEFLATE_LEVEL)
+            else:
+                return self.text
+            self._encoded[encoding] = data
+        return data
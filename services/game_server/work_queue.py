@@ -0,0 +1,128 @@
+"""
+Kolejki pracy sesji Game Servera.
+
+Pętla odczytu WebSocket tylko rozdziela ramki; akcje graczy trafiają do
+kolejki swojej sesji i są wykonywane po kolei przez jednego workera (worker
+znika, gdy kolejka opustoszeje). Zadanie oznaczone supersede=True anuluje
+trwające i czekające zadania tego samego gracza – o ile nie weszły jeszcze
+w fazę zapisu (commit_point()), po której anulowanie zostawiłoby pół tury.
+"""
+import os, asyncio, logging, contextvars
+from collections import deque
+
+log = logging.getLogger("game_server.work_queue")
+
+WORK_QUEUE_MAX = int(os.getenv("WORK_QUEUE_MAX", "16"))
+
+_current: contextvars.ContextVar["Job | None"] = contextvars.ContextVar("work_job", default=None)
+
+
+class Job:
+    __slots__ = ("player", "fn", "supersedable", "on_superseded", "ctx")
+
+    def __init__(self, player: str, fn, supersedable: bool, on_superseded=None):
+        self.player = player
+        self.fn = fn                       # fn() -> korutyna
+        self.supersedable = supersedable
+        self.on_superseded = on_superseded
+        self.ctx: contextvars.Context | None = None   # kontekst zgłaszającego (submit)
+
+
+def commit_point():
+    """Od tego miejsca bieżące zadanie nie może już zostać anulowane przez nowszą akcję."""
+    job = _current.get()
+    if job is not None:
+        job.supersedable = False
+
+
+class SessionWork:
+    def __init__(self, session_id: str, on_idle):
+        self.session_id = session_id
+        self._on_idle = on_idle
+        self._jobs: deque[Job] = deque()
+        self._running: Job | None = None
+        self._job_task: asyncio.Task | None = None
+        self._worker: asyncio.Task | None = None
+        self.superseded = 0
+
+    def __len__(self):
+        return len(self._jobs) + (self._running is not None)
+
+    def submit(self, job: Job, supersede: bool = False) -> bool:
+        if supersede:
+            self._supersede(job.player)
+        if len(self._jobs) >= WORK_QUEUE_MAX:
+            return False
+        # tagi logów/telemetrii zgłaszającego – worker żyje dłużej niż jedno połączenie
+        job.ctx = contextvars.copy_context()
+        self._jobs.append(job)
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+        return True
+
+    def _supersede(self, player: str):
+        for job in [j for j in self._jobs if j.player == player and j.supersedable]:
+            self._jobs.remove(job)
+            self._superseded(job)
+        cur = self._running
+        if cur is not None and cur.player == player and cur.supersedable:
+            self._job_task.cancel()
+
+    def _superseded(self, job: Job):
+        self.superseded += 1
+        if job.on_superseded:
+            job.on_superseded()
+
+    async def _run(self):
+        try:
+            while self._jobs:
+                job = self._running = self._jobs.popleft()
+                # zadanie we własnym Tasku – anulowanie go (supersede) nie zatrzymuje workera
+                job.ctx.run(_current.set, job)
+                task = self._job_task = asyncio.create_task(job.fn(), context=job.ctx)
+                try:
+                    await asyncio.wait((task,))
+                except asyncio.CancelledError:
+                    task.cancel()   # stop() – zatrzymujemy też bieżące zadanie
+                    raise
+                if task.cancelled():
+                    self._superseded(job)
+                elif task.exception() is not None:
+                    log.error("Session job failed: %r", task.exception(),
+                              exc_info=task.exception(), extra={"player": job.player})
+                self._running = self._job_task = None
+        finally:
+            self._running = self._job_task = self._worker = None
+            self._on_idle(self)
+
+    async def stop(self):
+        self._jobs.clear()
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+
+class WorkQueues:
+    def __init__(self):
+        self._sessions: dict[str, SessionWork] = {}
+
+    def submit(self, session_id: str, job: Job, supersede: bool = False) -> bool:
+        work = self._sessions.get(session_id)
+        if work is None:
+            work = self._sessions[session_id] = SessionWork(session_id, self._idle)
+        return work.submit(job, supersede)
+
+    def _idle(self, work: SessionWork):
+        if self._sessions.get(work.session_id) is work and not len(work):
+            del self._sessions[work.session_id]
+
+    def stats(self) -> dict:
+        return {"sessions": len(self._sessions), "jobs": sum(len(w) for w in self._sessions.values())}
+
+    async def stop(self):
+        for work in list(self._sessions.values()):
+            await work.stop()
+        self._sessions.clear()
@@ -1,7 +1,21 @@
 import asyncio
 import json
+import zlib
 import websockets
 
+try:
+    import msgpack
+except Exception:
+    msgpack = None
+
+def decode_frame(raw):
+    # tekst = JSON; binarne: zlib (encoding "deflate", nagłówek 0x78) albo msgpack
+    if isinstance(raw, str):
+        return json.loads(raw)
+    if raw[:1] == b"\x78":
+        return json.loads(zlib.decompress(raw))
+    return msgpack.unpackb(raw, raw=False)
+
 async def ws_connect(url: str, player: str, session_id: str):
     ws = await websockets.connect(url)
     await ws.send(json.dumps({"type":"login","player":player,"session_id":session_id}))
@@ -15,9 +29,13 @@ async def ws_connect_login(url: str, login_payload: dict):
 async def ws_send_action(ws, player: str, session_id: str, text: str):
     await ws.send(json.dumps({"type":"action","player":player,"session_id":session_id,"turn_id":0,"text_raw":text}))
 
-async def ws_wait_for(ws, msg_type: str, timeout=30):
+# ramka zamknięcia tury – zależy od trybu serwera (STORY_MODE=1 w single player daje story_update)
+TURN_UPDATE = ("narrative_update", "story_update")
+
+async def ws_wait_for(ws, msg_type: str | tuple[str, ...], timeout=30):
+    types = (msg_type,) if isinstance(msg_type, str) else msg_type
     while True:
         raw = await asyncio.wait_for(ws.recv(), timeout=timeout)
-        data = json.loads(raw)
-        if data.get("type") == msg_type:
+        data = decode_frame(raw)
+        if data.get("type") in types:
             return data
@@ -0,0 +1,18 @@
+import os, httpx, pytest
+
+ADMIN_BASE = os.getenv("ADMIN_BASE","http://localhost:8002")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN","dev_admin_token_123")
+
+@pytest.mark.admin
+def test_admin_bulk_log(session_id):
+    entries = [
+        {"session_id": session_id, "turn": 1, "actions": {"A": "investigate"}, "text": "Tura 1", "image": None, "audio": None},
+        {"session_id": session_id, "turn": 2, "actions": {"override": True}, "text": "[override] Admin updated media", "image": "", "audio": ""},
+    ]
+    r = httpx.post(f"{ADMIN_BASE}/log/bulk", headers={"X-Admin-Token":ADMIN_TOKEN}, json={"entries": entries}, timeout=10)
+    assert r.status_code == 200
+    assert r.json()["count"] == 2
+
+    # bez tokenu – odmowa
+    r = httpx.post(f"{ADMIN_BASE}/log/bulk", json={"entries": entries}, timeout=10)
+    assert r.status_code == 401
@@ -0,0 +1,22 @@
+import os, json, pytest
+from helpers_ws import ws_connect_login, ws_wait_for
+
+WS_URL = os.getenv("WS_URL","ws://localhost:65432/ws")
+
+@pytest.mark.asyncio
+@pytest.mark.sp
+async def test_repeated_link_keeps_one_edge():
+    # Wymaga STORY_MODE=1 – link scala krawędź po (from, to, label), powtórka nie dokłada drugiej
+    session = "link-" + os.urandom(3).hex()
+    ws = await ws_connect_login(WS_URL, {"type":"login","player":"Solo","session_id":session,"single_player":True})
+    await ws_wait_for(ws, "info")
+    link = {"type":"link","from":"Nóż","to":"Komendant","relation":"implies"}
+    await ws.send(json.dumps(link))
+    await ws.send(json.dumps(link))
+    for _ in range(2):
+        graph = (await ws_wait_for(ws, "graph_update", timeout=30))["case_graph"]
+        ids = {n["label"]: n["id"] for n in graph["nodes"]}
+        edges = [e for e in graph["edges"]
+                 if (e["from"], e["to"], e["label"]) == (ids["Nóż"], ids["Komendant"], "implies")]
+        assert len(edges) == 1
+    await ws.close()
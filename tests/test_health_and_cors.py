@@ -1,6 +1,7 @@
 import httpx
 import os
 import pytest
+from helpers_ws import TURN_UPDATE, ws_connect_login, ws_send_action, ws_wait_for
 
 ADMIN_BASE = os.getenv("ADMIN_BASE", "http://localhost:8002")
 VISION_BASE = os.getenv("PUBLIC_VISION_BASE", "http://localhost:8004")
@@ -8,6 +9,7 @@ TTS_BASE    = os.getenv("PUBLIC_TTS_BASE", "http://localhost:8001")
 AI_BASE     = os.getenv("PUBLIC_AI_BASE", "http://localhost:8003")
 GS_BASE     = os.getenv("GS_BASE", "http://localhost:65432")
 SUP_BASE    = os.getenv("SUP_BASE", "http://localhost:8005")
+WS_URL      = os.getenv("WS_URL", "ws://localhost:65432/ws")
 WEB_CLIENT_ORIGIN = os.getenv("WEB_CLIENT_ORIGIN", "http://localhost:5173")
 
 def _check_health(url):
@@ -25,3 +27,24 @@ def test_health_and_cors_headers():
             "Access-Control-Request-Method": "GET"
         }, timeout=5)
         assert r.status_code in (200, 204), f"OPTIONS failed for {url}"
+
+@pytest.mark.asyncio
+async def test_game_server_metrics():
+    # jedna tura, żeby histogram etapów miał próbki
+    session, player = "metrics-" + os.urandom(3).hex(), "Ala" + os.urandom(2).hex()
+    ws = await ws_connect_login(WS_URL, {"type":"login","player":player,"session_id":session,"single_player":True})
+    await ws_wait_for(ws, "info")
+    await ws_send_action(ws, player, session, "Rozglądam się")
+    await ws_wait_for(ws, TURN_UPDATE, timeout=60)
+    await ws.close()
+
+    r = httpx.get(f"{GS_BASE}/metrics", timeout=5)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert any(line.startswith("game_server_span_seconds_bucket{") for line in r.text.splitlines())
+
+def test_game_server_breakers_closed():
+    # zdrowy stos: każda usługa downstream (SERVICE_TIMEOUTS w game_server) z zamkniętym obwodem
+    breakers = _check_health(f"{GS_BASE}/health")["breakers"]
+    for service in ("supervisor", "ai", "tts", "vision", "admin"):
+        assert breakers[service]["state"] == "closed", service
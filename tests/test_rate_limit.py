@@ -0,0 +1,18 @@
+import os, json, pytest
+from helpers_ws import ws_connect_login, ws_send_action, ws_wait_for
+
+WS_URL = os.getenv("WS_URL","ws://localhost:65432/ws")
+
+@pytest.mark.asyncio
+async def test_spammed_action_rate_limited_locally():
+    # Druga akcja w oknie RATE_LIMIT_SECONDS nie idzie do Supervisora – od razu ramka rate_limited
+    session = "rl-" + os.urandom(3).hex()
+    player = "Spam" + os.urandom(2).hex()
+    ws = await ws_connect_login(WS_URL, {"type":"login","player":player,"session_id":session,"single_player":False})
+    await ws_wait_for(ws, "info")
+
+    await ws_send_action(ws, player, session, "Sprawdzam miejsce zbrodni")
+    await ws_send_action(ws, player, session, "Sprawdzam miejsce zbrodni")
+    msg = await ws_wait_for(ws, "rate_limited", timeout=10)
+    assert 0 < msg["retry_after"] <= 60
+    await ws.close()
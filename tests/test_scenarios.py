@@ -0,0 +1,36 @@
+import os, json, pytest, httpx, websockets
+from helpers_ws import ws_connect_login, ws_send_action, ws_wait_for
+
+GAME_URL = os.getenv("GAME_URL","http://localhost:65432")
+WS_URL = os.getenv("WS_URL","ws://localhost:65432/ws")
+
+def test_scenarios_listed():
+    r = httpx.get(f"{GAME_URL}/scenarios", timeout=10)
+    assert r.status_code == 200
+    names = [s["name"] for s in r.json()["scenarios"]]
+    assert "case_zero" in names
+
+@pytest.mark.asyncio
+async def test_session_picks_scenario_at_login():
+    # Sesja wybiera scenariusz skryptowany niezależnie od domyślnego SCENARIO serwera
+    session = "scn-" + os.urandom(3).hex()
+    login = {"type":"login","session_id":session,"single_player":False,"scenario":"case_zero"}
+    a = await ws_connect_login(WS_URL, {**login, "player":"Ala"})
+    b = await ws_connect_login(WS_URL, {**login, "player":"Bob"})
+    await ws_wait_for(a, "info"); await ws_wait_for(b, "info")
+
+    await ws_send_action(a, "Ala", session, "Rozglądam się")
+    await ws_send_action(b, "Bob", session, "Idę za partnerem")
+    upd = await ws_wait_for(a, "narrative_update", timeout=60)
+    assert upd["turn_id"] == 1
+    assert upd["text"].startswith("Deszcz pada nad miastem")
+    assert upd["image"].endswith("/assets/images/case_zero/turn1.png")
+    await a.close(); await b.close()
+
+@pytest.mark.asyncio
+async def test_unknown_scenario_rejected():
+    ws = await websockets.connect(WS_URL)
+    await ws.send(json.dumps({"type":"login","player":"Ala","session_id":"scn-x","scenario":"no_such_case"}))
+    err = await ws_wait_for(ws, "error", timeout=10)
+    assert err["reason"] == "unknown_scenario"
+    await ws.close()
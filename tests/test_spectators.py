@@ -0,0 +1,30 @@
+import os, json, pytest
+from helpers_ws import TURN_UPDATE, ws_connect_login, ws_send_action, ws_wait_for
+
+WS_URL = os.getenv("WS_URL","ws://localhost:65432/ws")
+
+@pytest.mark.asyncio
+async def test_spectator_receives_broadcasts_read_only():
+    session = "watch-" + os.urandom(3).hex()
+    player = "Ala" + os.urandom(2).hex()
+    p = await ws_connect_login(WS_URL, {"type":"login","player":player,"session_id":session,"single_player":True})
+    await ws_wait_for(p, "info")
+
+    s = await ws_connect_login(WS_URL, {"type":"login","role":"spectator","session_id":session})
+    info = await ws_wait_for(s, "info")
+    assert info["role"] == "spectator"
+
+    # widz nie gra – akcja odrzucona, tura zamyka się bez niego
+    await s.send(json.dumps({"type":"action","text_raw":"Kradnę dowody"}))
+    assert (await ws_wait_for(s, "error"))["reason"] == "read_only"
+    await ws_send_action(p, player, session, "Przeglądam akta")
+    upd_p = await ws_wait_for(p, TURN_UPDATE, timeout=60)
+    upd_s = await ws_wait_for(s, TURN_UPDATE, timeout=60)
+    assert upd_s == upd_p
+    await p.close(); await s.close()
+
+@pytest.mark.asyncio
+async def test_spectator_unknown_session():
+    s = await ws_connect_login(WS_URL, {"type":"login","role":"spectator","session_id":"nope-" + os.urandom(3).hex()})
+    assert (await ws_wait_for(s, "error"))["reason"] == "unknown_session"
+    await s.close()
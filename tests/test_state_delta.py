@@ -0,0 +1,44 @@
+import os, json, pytest, websockets
+from helpers_ws import ws_wait_for
+
+WS_URL = os.getenv("WS_URL","ws://localhost:65432/ws")
+
+@pytest.mark.asyncio
+@pytest.mark.sp
+async def test_story_update_delta_protocol():
+    # Wymaga STORY_MODE=1 – login daje snapshot, story_update niesie tylko operacje zmian
+    session = "delta-" + os.urandom(3).hex()
+    ws = await websockets.connect(WS_URL)
+    await ws.send(json.dumps({"type":"login","player":"Solo","session_id":session,"single_player":True,"delta":True}))
+    snap = await ws_wait_for(ws, "state_snapshot", timeout=10)
+    assert {"metrics","inventory","relations","casefile","case_graph"} <= set(snap["state"])
+
+    await ws.send(json.dumps({"type":"action","player":"Solo","session_id":session,"turn_id":0,"text_raw":"Sprawdzam miejsce zbrodni"}))
+    upd = await ws_wait_for(ws, "story_update", timeout=60)
+    assert "casefile" not in upd and "relations" not in upd
+    assert upd["state_version"] >= snap["state_version"]
+    assert upd["state_delta"]["base"] == snap["state_version"]
+    assert all(op["v"] > snap["state_version"] for op in upd["state_delta"]["ops"])
+
+    await ws.send(json.dumps({"type":"ack","state_version":upd["state_version"]}))
+    await ws.close()
+
+@pytest.mark.asyncio
+@pytest.mark.sp
+async def test_delta_mode_is_per_connection():
+    # Wymaga STORY_MODE=1 – późniejszy login z innym trybem nie zmienia ramek wcześniejszego klienta
+    session = "delta-mix-" + os.urandom(3).hex()
+    ws = await websockets.connect(WS_URL)
+    await ws.send(json.dumps({"type":"login","player":"Solo","session_id":session,"single_player":True}))
+    await ws_wait_for(ws, "info")
+    spec = await websockets.connect(WS_URL)
+    await spec.send(json.dumps({"type":"login","role":"spectator","session_id":session,"delta":True}))
+    snap = await ws_wait_for(spec, "state_snapshot", timeout=10)
+
+    await ws.send(json.dumps({"type":"action","player":"Solo","session_id":session,"turn_id":0,"text_raw":"Sprawdzam miejsce zbrodni"}))
+    full = await ws_wait_for(ws, "story_update", timeout=60)
+    assert "casefile" in full and "state_delta" not in full
+    upd = await ws_wait_for(spec, "story_update", timeout=60)
+    assert "casefile" not in upd and upd["state_delta"]["base"] == snap["state_version"]
+    assert upd["seq"] == full["seq"]
+    await ws.close(); await spec.close()
@@ -0,0 +1,45 @@
+import os, json, pytest, websockets
+from helpers_ws import ws_wait_for
+
+WS_URL = os.getenv("WS_URL","ws://localhost:65432/ws")
+
+@pytest.mark.asyncio
+@pytest.mark.sp
+async def test_story_progressive_media_ready():
+    # Wymaga STORY_MODE=1 – story_update bez mediów, potem media_ready z tym samym turn_id
+    session = "prog-" + os.urandom(3).hex()
+    ws = await websockets.connect(WS_URL)
+    await ws.send(json.dumps({"type":"login","player":"Solo","session_id":session,"single_player":True,"progressive":True}))
+    await ws.send(json.dumps({"type":"action","player":"Solo","session_id":session,"turn_id":0,"text_raw":"Przesłuchuję świadka"}))
+    story = await ws_wait_for(ws, "story_update", timeout=60)
+    assert story["voice_audio"] is None and story["image"] is None
+    assert {"voice_audio","image"} <= set(story["media_pending"])
+
+    kinds = set()
+    while not {"voice_audio","image"} <= kinds:
+        m = await ws_wait_for(ws, "media_ready", timeout=30)
+        assert m["turn_id"] == story["turn_id"]
+        assert m["kind"] in m
+        kinds.add(m["kind"])
+    await ws.close()
+
+@pytest.mark.asyncio
+@pytest.mark.sp
+async def test_progressive_mode_is_per_connection():
+    # Wymaga STORY_MODE=1 – widz bez trybu progresywnego dostaje jedną pełną ramkę tury
+    session = "prog-mix-" + os.urandom(3).hex()
+    ws = await websockets.connect(WS_URL)
+    await ws.send(json.dumps({"type":"login","player":"Solo","session_id":session,"single_player":True,"progressive":True}))
+    await ws_wait_for(ws, "info")
+    spec = await websockets.connect(WS_URL)
+    await spec.send(json.dumps({"type":"login","role":"spectator","session_id":session,"progressive":False}))
+    await ws_wait_for(spec, "info")
+
+    await ws.send(json.dumps({"type":"action","player":"Solo","session_id":session,"turn_id":0,"text_raw":"Przesłuchuję świadka"}))
+    story = await ws_wait_for(ws, "story_update", timeout=60)
+    assert story["voice_audio"] is None and "media_pending" in story
+    full = await ws_wait_for(spec, "story_update", timeout=60)
+    assert "media_pending" not in full and full["turn_id"] == story["turn_id"]
+    # ramki trybu progresywnego liczą się u widza jako odebrane
+    assert story["seq"] in full["replaces"] and full["seq"] > story["seq"]
+    await ws.close(); await spec.close()
@@ -0,0 +1,72 @@
+import os, asyncio, httpx, pytest
+from helpers_ws import ws_connect, ws_send_action, ws_wait_for, decode_frame
+
+WS_URL = os.getenv("WS_URL","ws://localhost:65432/ws")
+GS_BASE = os.getenv("GS_BASE","http://localhost:65432")
+TURN_TIMEOUT_SECONDS = float(os.getenv("TURN_TIMEOUT_SECONDS", "15"))
+
+async def collect(ws, seconds: float) -> list[dict]:
+    frames = []
+    loop = asyncio.get_running_loop()
+    end = loop.time() + seconds
+    while (left := end - loop.time()) > 0:
+        try:
+            frames.append(decode_frame(await asyncio.wait_for(ws.recv(), timeout=left)))
+        except asyncio.TimeoutError:
+            break
+    return frames
+
+async def wait_timer_fired(session: str, admin_headers: dict):
+    # timer tury uzbrojony, a potem zdjęty z koła = zamykanie tury (wait dla brakujących + narracja) trwa
+    armed = False
+    async with httpx.AsyncClient(timeout=5) as http:
+        while True:
+            r = await http.get(f"{GS_BASE}/timers", headers=admin_headers)
+            pending = any(t["session_id"] == session for t in r.json()["pending"])
+            if armed and not pending:
+                return
+            armed = armed or pending
+            await asyncio.sleep(0.02)
+
+@pytest.mark.asyncio
+async def test_action_during_turn_close_goes_to_next_turn(admin_headers):
+    session = "commit-" + os.urandom(3).hex()
+    ala, bob = "Ala" + os.urandom(2).hex(), "Bob" + os.urandom(2).hex()
+    a = await ws_connect(WS_URL, ala, session)
+    b = await ws_connect(WS_URL, bob, session)
+    await ws_wait_for(a, "info"); await ws_wait_for(b, "info")
+
+    # turę zamyka timer (Bob dostaje "wait"); akcja Boba przychodzi w trakcie generowania narracji
+    await ws_send_action(a, ala, session, "Przesłuchuję świadka")
+    await asyncio.wait_for(wait_timer_fired(session, admin_headers), TURN_TIMEOUT_SECONDS + 5)
+    await ws_send_action(b, bob, session, "Przeszukuję biuro")
+
+    upd = await ws_wait_for(b, "narrative_update", timeout=60)
+    # akcja nie zginęła z zamykaną turą – czeka w następnej na partnera
+    info = await ws_wait_for(b, "info", timeout=60)
+    assert "Czekamy na drugiego gracza" in info["message"]
+
+    await ws_send_action(a, ala, session, "Idę za Bobem")
+    nxt = await ws_wait_for(b, "narrative_update", timeout=60)
+    assert nxt["turn_id"] == upd["turn_id"] + 1
+    await a.close(); await b.close()
+
+@pytest.mark.asyncio
+async def test_timeout_racing_last_action_closes_turn_once():
+    session = "race-" + os.urandom(3).hex()
+    ala, bob = "Ala" + os.urandom(2).hex(), "Bob" + os.urandom(2).hex()
+    a = await ws_connect(WS_URL, ala, session)
+    b = await ws_connect(WS_URL, bob, session)
+    await ws_wait_for(a, "info"); await ws_wait_for(b, "info")
+
+    await ws_send_action(a, ala, session, "Przesłuchuję świadka")
+    # ostatnia akcja w chwili, gdy wygasa timer tury
+    await asyncio.sleep(TURN_TIMEOUT_SECONDS - 0.05)
+    await ws_send_action(b, bob, session, "Przeszukuję biuro")
+
+    frames = await collect(a, 15)
+    # timer i ostatnia akcja zamykają tę samą turę – narracja dokładnie raz; akcja, która przegrała
+    # z timerem, trafia do następnej tury (zamknie ją dopiero jej własny timeout)
+    updates = [f for f in frames if f.get("type") == "narrative_update"]
+    assert [u["turn_id"] for u in updates].count(updates[0]["turn_id"]) == 1
+    await a.close(); await b.close()
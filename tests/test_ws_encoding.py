@@ -0,0 +1,25 @@
+import os, pytest
+from helpers_ws import ws_connect_login, ws_send_action, ws_wait_for
+
+WS_URL = os.getenv("WS_URL","ws://localhost:65432/ws")
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("encoding", ["msgpack", "deflate"])
+async def test_login_negotiates_binary_encoding(encoding):
+    pytest.importorskip("msgpack")
+    session = f"enc-{encoding}-" + os.urandom(3).hex()
+    login = {"type":"login","session_id":session,"single_player":False,"encoding":encoding}
+    ala, bob = "Ala" + os.urandom(2).hex(), "Bob" + os.urandom(2).hex()
+    a = await ws_connect_login(WS_URL, {**login, "player":ala})
+    b = await ws_connect_login(WS_URL, {**login, "player":bob, "encoding":"json"})
+    info = await ws_wait_for(a, "info")
+    assert info["encoding"] == encoding
+    assert (await ws_wait_for(b, "info"))["encoding"] == "json"
+
+    # ten sam broadcast: binarnie dla Ali, tekstem dla Boba
+    await ws_send_action(a, ala, session, "Rozglądam się")
+    await ws_send_action(b, bob, session, "Idę za partnerem")
+    upd_a = await ws_wait_for(a, "narrative_update", timeout=60)
+    upd_b = await ws_wait_for(b, "narrative_update", timeout=60)
+    assert upd_a == upd_b
+    await a.close(); await b.close()
@@ -0,0 +1,53 @@
+import os, asyncio, pytest
+from helpers_ws import TURN_UPDATE, ws_connect_login, ws_send_action, ws_wait_for
+
+WS_URL = os.getenv("WS_URL","ws://localhost:65432/ws")
+
+@pytest.mark.asyncio
+async def test_rejoin_replays_missed_frames():
+    session = "resume-" + os.urandom(3).hex()
+    player = "Ala" + os.urandom(2).hex()
+    login = {"type":"login","player":player,"session_id":session,"single_player":True}
+    ws = await ws_connect_login(WS_URL, login)
+    info = await ws_wait_for(ws, "info")
+    seen = info["seq"]
+
+    # akcja i od razu rozłączenie – narracja tury wychodzi, gdy gracza nie ma
+    await ws_send_action(ws, player, session, "Rozglądam się po biurze")
+    await asyncio.sleep(0.2)
+    await ws.close()
+    await asyncio.sleep(3)
+
+    ws = await ws_connect_login(WS_URL, {**login, "last_seq": seen})
+    info = await ws_wait_for(ws, "info")
+    assert info["replay"] >= 1 and info["seq"] > seen
+    upd = await ws_wait_for(ws, TURN_UPDATE, timeout=60)
+    assert upd["turn_id"] == 1 and upd["seq"] > seen
+    await ws.close()
+
+    # numer spoza bufora – serwer nie zgaduje, klient odświeża stan sam
+    ws = await ws_connect_login(WS_URL, {**login, "last_seq": info["seq"] + 1000})
+    assert (await ws_wait_for(ws, "info"))["replay"] == "expired"
+    await ws.close()
+
+@pytest.mark.asyncio
+@pytest.mark.sp
+async def test_replay_is_frame_as_sent():
+    # Wymaga STORY_MODE=1 – story_update niesie pełny stan, który zmienia się co krok
+    session = "resume-sp-" + os.urandom(3).hex()
+    player = "Ala" + os.urandom(2).hex()
+    login = {"type":"login","player":player,"session_id":session,"single_player":True}
+    ws = await ws_connect_login(WS_URL, login)
+    start = (await ws_wait_for(ws, "info"))["seq"]
+    live = []
+    for text in ("Sprawdzam miejsce zbrodni", "Przesłuchuję świadka"):
+        await ws_send_action(ws, player, session, text)
+        live.append(await ws_wait_for(ws, "story_update", timeout=60))
+        await asyncio.sleep(1.1)   # limit akcji Supervisora
+    await ws.close()
+
+    ws = await ws_connect_login(WS_URL, {**login, "last_seq": start})
+    assert (await ws_wait_for(ws, "info"))["replay"] >= 2
+    for frame in live:
+        assert await ws_wait_for(ws, "story_update") == frame
+    await ws.close()
@@ -138,6 +138,9 @@ export default function App() {
       case 'error':
         pushLog(`ERROR: ${(msg as any).message || (msg as any).reason || 'undefined'}`)
         break
+      case 'rate_limited':
+        pushLog(`Za szybko – spróbuj ponownie za ${msg.retry_after.toFixed(1)} s`)
+        break
       case 'story_update':
         applyStoryUpdate(msg)
         break
@@ -145,7 +148,15 @@ export default function App() {
         console.log('[DEBUG] Handling image_update')
         applyImageUpdate(msg)
         break
+      case 'media_ready':
+        applyMediaReady(msg)
+        break
       case 'graph_update':
+        // serwer odsyła cały graf bez duplikatów; sama delta tylko jako fallback
+        if ((msg as any).case_graph) {
+          setCaseGraph((msg as any).case_graph)
+          return
+        }
         const delta = (msg as any).graph_delta
         setCaseGraph((g:any)=> ({
           nodes: [...(g.nodes||[]), ...(delta?.nodes_add || [])],
@@ -219,6 +230,13 @@ export default function App() {
     }
   }
 
+  const applyMediaReady = (m: any) => {
+    // media dochodzą osobno po story_update (tryb progresywny)
+    if (m.kind === 'image' && m.image) applyImageUpdate(m)
+    if (m.kind === 'voice_audio' && m.voice_audio) playVoice(m.voice_audio)
+    if (m.kind === 'sfx' && m.sfx?.length) playSfxQueue(m.sfx as string[])
+  }
+
   const applyNarrative = (n: any) => {
     setTurn(n.turn_id)
     setCurrentNarration(n.text || '')
@@ -1,6 +1,8 @@
 export type ServerInfo = {
   type: 'info'
   message: string
+  seq?: number
+  replay?: number | 'expired'
 }
 
 export type ServerError = {
@@ -8,6 +10,11 @@ export type ServerError = {
   reason: string
 }
 
+export type RateLimited = {
+  type: 'rate_limited'
+  retry_after: number
+}
+
 export type NarrativeUpdate = {
   type: 'narrative_update'
   session_id: string
@@ -48,6 +55,7 @@ export type StoryUpdate = {
   image?: string
   voice_audio?: string
   sfx?: string[]
+  media_pending?: string[]
 }
 
 export type ImageUpdate = {
@@ -57,7 +65,17 @@ export type ImageUpdate = {
   image: string
 }
 
-export type ServerMsg = ServerInfo | ServerError | NarrativeUpdate | OverrideUpdate | StoryUpdate | ImageUpdate
+export type MediaReady = {
+  type: 'media_ready'
+  session_id: string
+  turn_id: number
+  kind: 'voice_audio' | 'image' | 'sfx'
+  voice_audio?: string | null
+  image?: string | null
+  sfx?: string[] | null
+}
+
+export type ServerMsg = (ServerInfo | ServerError | RateLimited | NarrativeUpdate | OverrideUpdate | StoryUpdate | ImageUpdate | MediaReady) & { seq?: number, replaces?: number[] }
 
 export type ClientAction = {
   type: 'action'
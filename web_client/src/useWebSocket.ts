@@ -4,6 +4,9 @@ import type { ServerMsg, ClientAction } from './types'
 export function useWebSocket(wsUrl: string) {
   const wsRef = useRef<WebSocket | null>(null)
   const [connected, setConnected] = useState(false)
+  // ostatni numer ramki sesji odebrany bez luk (seq) + odebrane ponad nim (ahead) – przy ponownym
+  // połączeniu serwer odtworzy wszystko po seq; ramki mogą przyjść nie po kolei (podmiana w kolejce)
+  const lastSeqRef = useRef<{ sessionId: string, seq: number, ahead: Set<number> } | null>(null)
 
   const connect = useCallback((player: string, sessionId: string, singlePlayer: boolean = false) => {
     if (wsRef.current && (wsRef.current.readyState === WebSocket.OPEN || wsRef.current.readyState === WebSocket.CONNECTING)) {
@@ -14,7 +17,9 @@ export function useWebSocket(wsUrl: string) {
 
     ws.onopen = () => {
       setConnected(true)
-      const login = { type: 'login', player, session_id: sessionId, single_player: singlePlayer, bot_style: 'ostrożny śledczy' }
+      const login: Record<string, unknown> = { type: 'login', player, session_id: sessionId, single_player: singlePlayer, bot_style: 'ostrożny śledczy', progressive: true }
+      if (lastSeqRef.current?.sessionId === sessionId) login.last_seq = lastSeqRef.current.seq
+      else lastSeqRef.current = { sessionId, seq: -1, ahead: new Set() }
       ws.send(JSON.stringify(login))
     }
     ws.onclose = () => { setConnected(false) }
@@ -38,11 +43,26 @@ export function useWebSocket(wsUrl: string) {
     wsRef.current.send(JSON.stringify(payload))
   }, [])
 
+  const trackSeq = (data: ServerMsg) => {
+    const t = lastSeqRef.current
+    if (!t) return
+    if (data.type === 'info' && typeof data.seq === 'number') {
+      // pierwsze wejście albo bufor serwera już nie sięga – liczymy od bieżącego numeru sesji
+      if (t.seq < 0 || data.replay === 'expired') { t.seq = data.seq; t.ahead.clear() }
+      return
+    }
+    for (const n of [...(data.replaces ?? []), ...(typeof data.seq === 'number' ? [data.seq] : [])]) {
+      if (n > t.seq) t.ahead.add(n)
+    }
+    while (t.ahead.has(t.seq + 1)) { t.seq += 1; t.ahead.delete(t.seq) }
+  }
+
   const onMessage = useCallback((handler: (msg: ServerMsg) => void) => {
     if (!wsRef.current) return
     wsRef.current.onmessage = (ev) => {
       try {
         const data = JSON.parse(ev.data) as ServerMsg
+        trackSeq(data)
         handler(data)
       } catch {
         // ignore malformed